@@ -1,3 +1,11 @@
-from .tools.agent import root_agent
-
 __all__ = ['root_agent']
+
+
+def __getattr__(name):
+    # Importación diferida: ADK, LiteLLM y MCP sólo se cargan cuando se pide el agente.
+    # ADK busca `<paquete>.agent.root_agent`, así que también se expone `agent`.
+    if name in ("root_agent", "agent"):
+        from .tools import agent
+
+        return agent if name == "agent" else agent.root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,307 @@
+"""Benchmark de carga de las herramientas contra el servidor de réplica local.
+
+Arranca `replay_server` en el mismo proceso, apunta las herramientas a él
+(balldontlie, jsDelivr y open.er-api.com), usa bases SQLite temporales y lanza
+cada escenario con varios niveles de concurrencia. Para cada nivel informa el
+rendimiento (llamadas por segundo), la latencia p50/p95/p99 y las peticiones
+que llegaron al servidor de réplica, es decir, las llamadas a las APIs
+externas que habría hecho el agente.
+
+Por defecto las cachés de las herramientas funcionan como en producción, así
+que tras la primera llamada ("cold") casi todo se responde sin red. Con
+`--no-cache` cada llamada es un fallo de caché: `exchangerate` vacía la caché
+de tasas y descarga la tabla (con la cobertura entre fuentes), y cada llamada
+de la NBA espera una sincronización incremental a través del planificador de
+balldontlie (si falla, la llamada cuenta como error). Así la latencia, los errores y la concurrencia del servidor de
+réplica sí se reflejan en los resultados.
+
+Escenarios:
+    nba_today          nba_predict_prob sin argumentos (partidos de hoy)
+    nba_team           nba_predict_prob con team_name
+    nba_matchup        nba_predict_prob con home_team_id y away_team_id
+    exchangerate       exchangerate con montos y sentidos al azar
+    query_data_source  consultas de pedidos y clientes sobre un conjunto generado
+
+Uso:
+    python -m my_whatsapp_agent.benchmarks.load --concurrency 1,8,32 --requests 200 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from my_whatsapp_agent.benchmarks import replay_server
+
+SCENARIOS = ("nba_today", "nba_team", "nba_matchup", "exchangerate", "query_data_source")
+
+# Desactiva la memoización por argumentos de `--as-agent` con `--no-cache`.
+NO_CACHE_ENV = {
+    "TOOL_CACHE_TTL_NBA_PREDICT_PROB": "0",
+    "TOOL_CACHE_TTL_EXCHANGERATE": "0",
+    "TOOL_CACHE_TTL_QUERY_DATA_SOURCE": "0",
+}
+
+_FIRST_NAMES = ("Juan", "María", "José", "Ana", "Luis", "Carmen", "Pedro", "Rosa", "Miguel", "Lucía",
+                "Carlos", "Elena", "Rafael", "Sofía", "Andrés", "Isabel", "Jorge", "Paula", "Ramón", "Teresa")
+_LAST_NAMES = ("Pérez", "Rodríguez", "Gómez", "Martínez", "Fernández", "López", "Díaz", "Sánchez", "Ramírez",
+               "Torres", "Jiménez", "Reyes", "Castillo", "Núñez", "Guzmán", "Almonte", "Peña", "Vásquez")
+_ORDER_STATUSES = ("pendiente", "enviado", "entregado", "cancelado", "en preparación")
+
+
+def write_dataset(directory, customers, orders, seed=0):
+    """Genera `clientes.csv` y `pedidos.jsonl` y devuelve las rutas y una muestra para las consultas."""
+    rng = random.Random(seed)
+    customers_path = os.path.join(directory, "clientes.csv")
+    orders_path = os.path.join(directory, "pedidos.jsonl")
+    names = []
+    with open(customers_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "nombre", "email", "telefono", "saldo"])
+        for i in range(1, customers + 1):
+            first, last = rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+            name = f"{first} {last} {rng.choice(_LAST_NAMES)}"
+            email = f"{first.lower()}.{i}@example.com"
+            writer.writerow([f"C{i}", name, email, f"809-{rng.randint(200, 999)}-{i % 10000:04d}",
+                             f"{rng.uniform(0, 5000):.2f}"])
+            names.append((f"C{i}", name, email))
+    with open(orders_path, "w", encoding="utf-8") as f:
+        for i in range(1, orders + 1):
+            record = {
+                "id": f"{10000 + i}",
+                "cliente_id": f"C{rng.randint(1, customers)}",
+                "estado": rng.choice(_ORDER_STATUSES),
+                "fecha": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "total": round(rng.uniform(5, 900), 2),
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sample = rng.sample(names, min(len(names), 500))
+    return customers_path, orders_path, sample
+
+
+def data_queries(sample, orders):
+    """Mezcla de consultas como las que llegan por WhatsApp, incluidas algunas sin resultado."""
+    def query(rng):
+        _, name, email = rng.choice(sample)
+        kind = rng.random()
+        if kind < 0.35:
+            return f"estado del pedido #{10000 + rng.randint(1, orders)}"
+        if kind < 0.6:
+            return f"información del cliente {name}"
+        if kind < 0.75:
+            return f"cliente {email}"
+        if kind < 0.9:
+            return f"pedidos de {name.split()[0]} {name.split()[1]}"
+        return f"pedido #X-{rng.randint(1, 999)}"
+    return query
+
+
+def build_calls(sample, orders, as_agent, no_cache):
+    """Una corrutina por escenario que hace una llamada con argumentos al azar."""
+    from my_whatsapp_agent.tools import exchangerate_tool, nba_store, nba_teams
+    from my_whatsapp_agent.tools.data_tools import query_data_source
+    from my_whatsapp_agent.tools.nba_tool import nba_predict_prob
+
+    exchangerate = exchangerate_tool.exchangerate
+    if as_agent:
+        from my_whatsapp_agent.tools.agent import instrumented_tool
+        nba_predict_prob, exchangerate, query_data_source = (
+            instrumented_tool(f) for f in (nba_predict_prob, exchangerate, query_data_source)
+        )
+    team_names = [t.aliases[0] for t in nba_teams.TEAMS]
+    data_query = data_queries(sample, orders)
+
+    def convert(amount, direction):
+        if no_cache:
+            exchangerate_tool._rate_cache.clear()
+        return exchangerate(amount, direction)
+
+    async def nba(**kwargs):
+        if no_cache:
+            # Si la sincronización falla, la llamada cuenta como error: el usuario no recibiría
+            # los datos nuevos que estaba esperando.
+            await asyncio.to_thread(nba_store.get_store().sync)
+        return await nba_predict_prob(**kwargs)
+
+    async def nba_today(rng):
+        return await nba()
+
+    async def nba_team(rng):
+        return await nba(team_name=rng.choice(team_names))
+
+    async def nba_matchup(rng):
+        home, away = rng.sample(range(1, 31), 2)
+        return await nba(home_team_id=home, away_team_id=away)
+
+    async def exchange(rng):
+        amount = round(rng.uniform(1, 1000), 2)
+        return await asyncio.to_thread(convert, amount, rng.choice(("usd_to_dop", "dop_to_usd")))
+
+    async def data(rng):
+        return await asyncio.to_thread(query_data_source, data_query(rng))
+
+    return {
+        "nba_today": nba_today,
+        "nba_team": nba_team,
+        "nba_matchup": nba_matchup,
+        "exchangerate": exchange,
+        "query_data_source": data,
+    }
+
+
+def percentile(sorted_values, q):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_level(call, concurrency, requests, seed, is_error):
+    """Lanza `requests` llamadas con `concurrency` en curso a la vez y mide cada una."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(slot):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + slot)
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                result = await call(rng)
+                failed = is_error(result)
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(slot) for slot in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def _upstream(stats):
+    return sum(route["requests"] for route in stats.values())
+
+
+async def run_scenarios(server, calls, scenarios, levels, requests, seed, is_error):
+    loop = asyncio.get_running_loop()
+    # Las herramientas síncronas van a hilos; uno por llamada concurrente como mínimo.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(levels) + 4, thread_name_prefix="bench"))
+    results = []
+    for name in scenarios:
+        call = calls[name]
+        # La primera llamada paga la carga inicial (sincronización, primera tasa); se mide aparte.
+        server.reset_stats()
+        cold = await run_level(call, 1, 1, seed, is_error)
+        results.append({"scenario": name, "concurrency": "cold", **cold,
+                        "upstream_requests": _upstream(server.stats()), "upstream": server.stats()})
+        for concurrency in levels:
+            server.reset_stats()
+            level = await run_level(call, concurrency, requests, seed + concurrency, is_error)
+            stats = server.stats()
+            results.append({"scenario": name, "concurrency": concurrency, **level,
+                            "upstream_requests": _upstream(stats), "upstream": stats})
+    return results
+
+
+def print_table(results, out=sys.stdout):
+    header = (f"{'escenario':<18} {'conc':>5} {'llamadas':>8} {'errores':>7} {'llam/s':>9} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'upstream':>8}")
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for r in results:
+        print(f"{r['scenario']:<18} {r['concurrency']!s:>5} {r['requests']:>8} {r['errors']:>7} "
+              f"{r['throughput_rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['upstream_requests']:>8}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"escenarios separados por comas (por defecto todos: {','.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", default="1,8,32", help="niveles de concurrencia (por defecto 1,8,32)")
+    parser.add_argument("--requests", type=int, default=200, help="llamadas por nivel (por defecto 200)")
+    parser.add_argument("--customers", type=int, default=20000, help="clientes generados (por defecto 20000)")
+    parser.add_argument("--orders", type=int, default=50000, help="pedidos generados (por defecto 50000)")
+    parser.add_argument("--as-agent", action="store_true",
+                        help="envuelve las herramientas como el agente (caché por argumentos y métricas)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="cada llamada es un fallo de caché, para medir el camino hasta las APIs")
+    parser.add_argument("--json", action="store_true", help="imprime el resultado como JSON")
+    replay_server.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = sorted(set(scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    server = replay_server.from_arguments(args).start()
+    with tempfile.TemporaryDirectory(prefix="whatsapp-agent-bench-") as workdir:
+        # Las herramientas leen su configuración al importarse: el entorno va antes que los imports.
+        os.environ.update(server.env())
+        os.environ["NBA_STORE_PATH"] = os.path.join(workdir, "nba_games.sqlite3")
+        os.environ["DATA_STORE_PATH"] = os.path.join(workdir, "data.sqlite3")
+        os.environ.setdefault("BALLDONTLIE_API_KEY", "benchmark")
+        # Sin límite de cuota efectivo: se mide la herramienta, no el plan de balldontlie.
+        os.environ.setdefault("BALLDONTLIE_RATE_PER_MINUTE", "600000")
+        if args.no_cache:
+            os.environ.update(NO_CACHE_ENV)
+
+        from my_whatsapp_agent.tools import data_store, memoize
+
+        sample = []
+        if "query_data_source" in scenarios:
+            customers_path, orders_path, sample = write_dataset(workdir, args.customers, args.orders, args.seed)
+            store = data_store.get_store()
+            store.ingest(customers_path)
+            store.ingest(orders_path)
+            store.optimize()
+
+        calls = build_calls(sample, args.orders, args.as_agent, args.no_cache)
+        try:
+            results = asyncio.run(run_scenarios(
+                server, calls, scenarios, levels, args.requests, args.seed, memoize.is_error_result,
+            ))
+        finally:
+            server.stop()
+
+    config = {
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "requests": args.requests,
+        "as_agent": args.as_agent,
+        "no_cache": args.no_cache,
+    }
+    if args.json:
+        print(json.dumps({"config": config, "results": results}, indent=2, ensure_ascii=False))
+        return
+    print(" ".join(f"{k}={v}" for k, v in config.items()))
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
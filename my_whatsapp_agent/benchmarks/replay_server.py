@@ -0,0 +1,257 @@
+"""Servidor HTTP local que reemplaza a las APIs externas en los benchmarks.
+
+Sirve respuestas grabadas de las fuentes de tasas de cambio (`fixtures/`) y
+un calendario de partidos de la NBA generado con semilla fija alrededor de la
+fecha de hoy (las herramientas buscan los partidos de hoy, así que un
+calendario grabado quedaría viejo). A cada respuesta se le puede añadir
+latencia, variación aleatoria de la latencia y una tasa de errores, y cuenta
+las peticiones recibidas por ruta.
+
+Rutas:
+    /balldontlie/v1/games                 partidos paginados con `cursor`
+    /currency-api/usd.json                fuente de jsDelivr
+    /er-api/v6/latest/USD                 fuente de open.er-api.com
+    /__stats                              contadores de peticiones (JSON)
+
+Uso independiente (imprime las variables de entorno para apuntar el agente):
+    python -m my_whatsapp_agent.benchmarks.replay_server --port 8800 --latency-ms 80
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from my_whatsapp_agent.tools import nba_teams
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+GAMES_PATH = "/balldontlie/v1/games"
+CURRENCY_API_PATH = "/currency-api/usd.json"
+ER_API_PATH = "/er-api/v6/latest/USD"
+
+# Días de calendario que se generan antes y después de hoy.
+PAST_DAYS = 200
+FUTURE_DAYS = 21
+GAMES_PER_DAY = 7
+MAX_PAGE_SIZE = 100
+
+
+def generate_games(today=None, seed=0):
+    """Calendario sintético: partidos terminados hasta ayer, pendientes desde hoy.
+
+    Los equipos de cada día se emparejan al azar (con semilla fija) y cada equipo
+    tiene una fuerza propia, para que los modelos de predicción no den siempre 50 %.
+    """
+    today = today or date.today()
+    rng = random.Random(seed)
+    strength = {team.id: rng.uniform(-8, 8) for team in nba_teams.TEAMS}
+    team_ids = list(strength)
+    games = []
+    for offset in range(-PAST_DAYS, FUTURE_DAYS + 1):
+        day = today + timedelta(days=offset)
+        rng.shuffle(team_ids)
+        for i in range(GAMES_PER_DAY):
+            home, away = team_ids[2 * i], team_ids[2 * i + 1]
+            game = {
+                "id": len(games) + 1,
+                "date": day.isoformat(),
+                "datetime": f"{day.isoformat()}T23:30:00.000Z",
+                "season": day.year if day.month >= 10 else day.year - 1,
+                "status": "7:30 pm ET",
+                "home_team": {"id": home},
+                "visitor_team": {"id": away},
+                "home_team_score": 0,
+                "visitor_team_score": 0,
+            }
+            if offset < 0:
+                # Sin empates: un margen de 0 cuenta como victoria local por un punto.
+                margin = round(strength[home] - strength[away] + 3 + rng.gauss(0, 12)) or 1
+                base = rng.randint(100, 115)
+                game["status"] = "Final"
+                game["home_team_score"] = base + max(margin, 0)
+                game["visitor_team_score"] = base + max(-margin, 0)
+            games.append(game)
+    return games
+
+
+def _load_fixture(fixtures_dir, name):
+    with open(os.path.join(fixtures_dir, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ReplayServer:
+    """Servidor de réplica en un hilo propio.
+
+    Args:
+        host (str): Dirección donde escuchar.
+        port (int): Puerto; `0` elige uno libre.
+        latency (float): Segundos que tarda cada respuesta.
+        jitter (float): Variación uniforme (±) de la latencia, en segundos.
+        error_rate (float): Fracción de peticiones que fallan con `error_status`.
+        error_status (int): Código de los errores inyectados; los 429 llevan `Retry-After`.
+        fixtures_dir (str): Carpeta con las respuestas grabadas.
+        seed (int): Semilla del calendario y de los errores inyectados.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, fixtures_dir=FIXTURES_DIR, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._errors = Counter()
+        self._games = generate_games(seed=seed)
+        self._routes = {
+            GAMES_PATH: self._games_page,
+            CURRENCY_API_PATH: lambda query: _load_fixture(fixtures_dir, "currency-api-usd.json"),
+            ER_API_PATH: lambda query: _load_fixture(fixtures_dir, "er-api-usd.json"),
+        }
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Variables de entorno que apuntan las herramientas a este servidor."""
+        return {
+            "BALLDONTLIE_BASE_URL": self.url + GAMES_PATH.rsplit("/", 1)[0],
+            "EXCHANGERATE_CURRENCY_API_URL": self.url + CURRENCY_API_PATH,
+            "EXCHANGERATE_ER_API_URL": self.url + ER_API_PATH,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self):
+        """Peticiones y errores inyectados por ruta desde el arranque o el último `reset_stats`."""
+        with self._lock:
+            return {
+                path: {"requests": self._requests[path], "errors": self._errors[path]}
+                for path in sorted(self._requests)
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._requests.clear()
+            self._errors.clear()
+
+    # --- Respuestas ---------------------------------------------------------------
+
+    def _games_page(self, query):
+        start = query.get("start_date", [""])[0]
+        end = query.get("end_date", ["9999-12-31"])[0]
+        per_page = min(int(query.get("per_page", ["25"])[0]), MAX_PAGE_SIZE)
+        cursor = int(query.get("cursor", ["0"])[0])
+        # Los ids crecen con la fecha, así que el cursor es el último id devuelto.
+        matching = [g for g in self._games if start <= g["date"] <= end and g["id"] > cursor]
+        page = matching[:per_page]
+        meta = {"per_page": per_page}
+        if len(matching) > per_page:
+            meta["next_cursor"] = page[-1]["id"]
+        return {"data": page, "meta": meta}
+
+    def _respond(self, path, query):
+        """Devuelve `(status, headers, cuerpo)` para una petición."""
+        if path == "/__stats":
+            return 200, {}, self.stats()
+        with self._lock:
+            self._requests[path] += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            failed = path in self._routes and self._rng.random() < self.error_rate
+            if failed:
+                self._errors[path] += 1
+        if delay:
+            time.sleep(delay)
+        route = self._routes.get(path)
+        if route is None:
+            return 404, {}, {"error": f"ruta sin fixture: {path}"}
+        if failed:
+            headers = {"Retry-After": "1"} if self.error_status == 429 else {}
+            return self.error_status, headers, {"error": "error inyectado por el servidor de réplica"}
+        return 200, {}, route(query)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                status, headers, payload = server._respond(parts.path, parse_qs(parts.query))
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def add_arguments(parser):
+    """Opciones del servidor compartidas con `benchmarks.load`."""
+    parser.add_argument("--latency-ms", type=float, default=50, help="latencia de cada respuesta (por defecto 50)")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="variación ± de la latencia (por defecto 20)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas con error (por defecto 0)")
+    parser.add_argument("--error-status", type=int, default=503, help="código de los errores inyectados (por defecto 503)")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="carpeta con las respuestas grabadas")
+    parser.add_argument("--seed", type=int, default=0, help="semilla del calendario y de los errores")
+
+
+def from_arguments(args, port=0):
+    return ReplayServer(
+        port=port,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        fixtures_dir=args.fixtures,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8800, help="puerto donde escuchar (por defecto 8800)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = from_arguments(args, port=args.port).start()
+    print(f"Servidor de réplica en {server.url}. Variables de entorno:")
+    for name, value in server.env().items():
+        print(f"  export {name}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark de arranque del agente.
+
+Mide, en procesos nuevos, cuánto tarda `import my_whatsapp_agent` y cuánto
+tarda el proceso en producir su primera respuesta de una herramienta (o en
+construir el agente completo con `--target agent`).
+
+Uso:
+    python -m my_whatsapp_agent.benchmarks.startup --runs 5 --target data
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Código que produce la primera respuesta para cada objetivo.
+FIRST_RESPONSE = {
+    "data": (
+        "from my_whatsapp_agent.tools.data_tools import query_data_source\n"
+        "query_data_source('estado del pedido')\n"
+    ),
+    "exchangerate": (
+        "from my_whatsapp_agent.tools.exchangerate_tool import exchangerate\n"
+        "exchangerate(1.0)\n"
+    ),
+    "nba": (
+        "from my_whatsapp_agent.tools.nba_tool import nba_predict_prob_sync\n"
+        "nba_predict_prob_sync(team_name='lakers')\n"
+    ),
+    "agent": (
+        "import asyncio\n"
+        "from my_whatsapp_agent.tools.agent import get_agent\n"
+        "asyncio.run(get_agent())\n"
+    ),
+}
+
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import my_whatsapp_agent
+t1 = time.perf_counter()
+{first_response}
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_response_s": t2 - t0}}))
+"""
+
+
+def run_once(target):
+    """Ejecuta una medición en un proceso nuevo y devuelve sus tiempos en segundos."""
+    code = _PROBE.format(first_response=FIRST_RESPONSE[target])
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "probe failed")
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings["process_wall_s"] = wall
+    return timings
+
+
+def summarize(samples):
+    """Mínimo, mediana y máximo (en milisegundos) de cada métrica."""
+    summary = {}
+    for metric in ("import_s", "first_response_s", "process_wall_s"):
+        values = [s[metric] * 1000 for s in samples]
+        summary[metric.replace("_s", "_ms")] = {
+            "min": round(min(values), 1),
+            "median": round(statistics.median(values), 1),
+            "max": round(max(values), 1),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="procesos a medir (por defecto 5)")
+    parser.add_argument(
+        "--target", choices=sorted(FIRST_RESPONSE), default="data",
+        help="qué primera respuesta medir (por defecto data, que no usa la red)",
+    )
+    parser.add_argument("--json", action="store_true", help="imprime el resultado como JSON")
+    args = parser.parse_args(argv)
+
+    samples = [run_once(args.target) for _ in range(args.runs)]
+    summary = summarize(samples)
+    if args.json:
+        print(json.dumps({"target": args.target, "runs": args.runs, **summary}, indent=2))
+        return
+    print(f"target={args.target} runs={args.runs}")
+    for metric, stats in summary.items():
+        print(f"  {metric:<22} min={stats['min']:>8.1f}  median={stats['median']:>8.1f}  max={stats['max']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
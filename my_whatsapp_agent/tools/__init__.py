@@ -1,4 +1,10 @@
-from .agent import root_agent
-
 __all__ = ["root_agent"]
 
+
+def __getattr__(name):
+    # Importación diferida: ver my_whatsapp_agent/__init__.py.
+    if name == "root_agent":
+        from . import agent
+
+        return agent.root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
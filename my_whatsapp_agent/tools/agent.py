@@ -1,36 +1,115 @@
 import asyncio
-from dotenv import load_dotenv
-from google.adk.agents.llm_agent import LlmAgent
-from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, StdioServerParameters
-from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm
-from google.adk.tools.function_tool import FunctionTool
-from .exchangerate_tool import exchangerate
-from .nba_tool import nba_predict_prob
+import functools
+import logging
 import os
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack
 
-# Load environment variables
-load_dotenv()
+from . import metrics
+from .memoize import memoize_tool
+
+logger = logging.getLogger(__name__)
+
+# Las dependencias pesadas (ADK, LiteLLM, MCP) y los módulos de herramientas se
+# importan dentro de las funciones que los usan, no al importar el paquete.
+
+
+@functools.lru_cache(maxsize=None)
+def load_environment():
+    """Carga el archivo .env una sola vez."""
+    from dotenv import load_dotenv
+
+    # Load environment variables
+    load_dotenv()
+
+
+@functools.lru_cache(maxsize=None)
+def get_model():
+    """Devuelve el modelo LiteLLM compartido, creándolo en el primer uso."""
+    from google.adk.models.lite_llm import LiteLlm
+
+    load_environment()
+    # Initialize the LiteLLM model
+    return LiteLlm(model="openai/gpt-4o-mini")
 
-# Initialize the LiteLLM model
-lite_llm_model = LiteLlm(model="openai/gpt-4o-mini")
 
 # Create a global agent instance
 _agent_instance = None
 _exit_stack = None
+_agent_lock = asyncio.Lock()
+_mcp_pool = None
+
+# Segundos que se reutiliza el resultado de cada herramienta con los mismos argumentos.
+# Se puede cambiar con TOOL_CACHE_TTL_<NOMBRE> (ej: TOOL_CACHE_TTL_EXCHANGERATE=10); 0 desactiva la caché.
+TOOL_CACHE_TTL_SECONDS = {
+    "exchangerate": 30,
+    "convert_currencies": 30,
+    "nba_predict_prob": 60,
+    "nba_predict_batch": 60,
+    "query_data_source": 30,
+}
+
+
+def cached_tool(func, side_effects=False):
+    """Envuelve una herramienta con memoización y coalescencia según su TTL configurado."""
+    name = func.__name__
+    ttl = float(os.getenv(f"TOOL_CACHE_TTL_{name.upper()}", TOOL_CACHE_TTL_SECONDS.get(name, 0)))
+    maxsize = int(os.getenv("TOOL_CACHE_MAXSIZE", "256"))
+    wrapper = memoize_tool(ttl=ttl, maxsize=maxsize, side_effects=side_effects or ttl <= 0)(func)
+    if hasattr(wrapper, "cache_info"):
+        metrics.register_cache(f"tool:{name}", wrapper.cache_info)
+    return wrapper
+
+
+def instrumented_tool(func, side_effects=False):
+    """Herramienta cacheada (ver `cached_tool`) y medida por `metrics`, incluidas las respuestas desde la caché."""
+    return metrics.instrument_tool(cached_tool(func, side_effects), name=func.__name__)
+
 
 async def create_agent():
-    """Create and initialize the agent with MCP tools."""
-    global _agent_instance, _exit_stack
-    
+    """Create and initialize the agent with MCP tools.
+
+    Fábrica cacheada: la primera llamada construye el agente y las siguientes
+    devuelven la misma instancia. Devuelve `(agent, exit_stack)`.
+
+    Arranca de inmediato todos los servidores MCP del pool (MCP_POOL_SIZE) en
+    paralelo; llamarla al iniciar el proceso evita que el primer usuario
+    espere el arranque de npx.
+    """
     if _agent_instance is not None:
         return _agent_instance, _exit_stack
     
+    async with _agent_lock:
+        if _agent_instance is not None:
+            return _agent_instance, _exit_stack
+        return await _build_agent()
+
+
+async def get_agent():
+    """Devuelve el agente construido por `create_agent`, sin el exit stack."""
+    agent, _ = await create_agent()
+    return agent
+
+
+async def _build_agent():
+    global _agent_instance, _exit_stack, _mcp_pool
+
+    load_environment()
+    metrics.start_http_server()
+    from google.adk.agents.llm_agent import LlmAgent
+    from google.adk.tools.function_tool import FunctionTool
+    from google.adk.tools.mcp_tool.mcp_toolset import StdioServerParameters
+
+    from .data_tools import query_data_source
+    from .exchangerate_tool import convert_currencies, exchangerate
+    from .mcp_pool import MCPServerPool
+    from .nba_tool import nba_predict_batch, nba_predict_prob
+
     try:
-        # Initialize MCP tools
-        mcp_tools, exit_stack = await MCPToolset.from_server(
-            connection_params=StdioServerParameters(
+        # Initialize MCP tools. Desktop Commander lee/escribe archivos y ejecuta comandos,
+        # así que sus herramientas nunca pasan por la caché de resultados.
+        # Un pool de servidores supervisado reparte las llamadas y reinicia los que se cuelgan.
+        _mcp_pool = MCPServerPool(
+            StdioServerParameters(
                 command='npx',
                 args=[
                     "-y",
@@ -38,19 +117,32 @@ async def create_agent():
                 ],
             )
         )
+        await _mcp_pool.start()
+        mcp_tools = _mcp_pool.tools()
+        exit_stack = AsyncExitStack()
+        exit_stack.push_async_callback(_mcp_pool.close)
         
         # Crear la herramienta de conversión de moneda
-        currency_conversion_tool = FunctionTool(func=exchangerate)
+        currency_conversion_tool = FunctionTool(func=instrumented_tool(exchangerate))
+
+        # Conversión entre cualquier par de monedas, una o varias a la vez
+        currency_batch_tool = FunctionTool(func=instrumented_tool(convert_currencies))
         
-        # Crear la herramienta de predicciones de la NBA
-        nba_prediction_tool = FunctionTool(func=nba_predict_prob)
+        # Crear la herramienta de predicciones de la NBA (asíncrona, no bloquea el event loop)
+        nba_prediction_tool = FunctionTool(func=instrumented_tool(nba_predict_prob))
+
+        # Predicciones de varios partidos (o de toda la jornada) en una sola llamada
+        nba_batch_tool = FunctionTool(func=instrumented_tool(nba_predict_batch))
+
+        # Consultas de clientes y pedidos sobre el almacén indexado
+        data_source_tool = FunctionTool(func=instrumented_tool(query_data_source))
         
         # Combinar herramientas MCP con herramientas personalizadas
-        all_tools = mcp_tools + [currency_conversion_tool, nba_prediction_tool]
+        all_tools = mcp_tools + [currency_conversion_tool, currency_batch_tool, nba_prediction_tool, nba_batch_tool, data_source_tool]
         
         # Create the agent
         _agent_instance = LlmAgent(
-            model=lite_llm_model,
+            model=get_model(),
             name='my_whatsapp_agent',
             instruction='''Soy un agente útil que utiliza el modelo de OpenAI a través de LiteLlm.
                          Tengo acceso a herramientas para interactuar con el sistema de archivos y ejecutar comandos.
@@ -58,22 +150,49 @@ async def create_agent():
                          Al usar `exchangerate`, si el usuario no especifica la cantidad, asume 1.0.
                          Si no especifica la dirección, asume "usd_to_dop".
                          Siempre informo la tasa de cambio utilizada en la conversión.
+                         Para otras monedas (EUR, MXN, etc.) o varias conversiones a la vez uso `convert_currencies`
+                         con una lista de objetos con "amount", "from" y "to" en una sola llamada.
                          Adicionalmente, puedo proporcionar información y predicciones de partidos de la NBA usando la herramienta `nba_predict_prob`.
                          - Si no se especifican equipos, muestro los partidos de hoy.
                          - Si se especifica un `team_name`:
                            - Por defecto (o si se pide explícitamente predicción), busco su próximo partido y doy una predicción.
                            - Si el usuario solo quiere saber el próximo partido (sin predicción), puedo usar `nba_predict_prob` con `get_prediction` en `False`.
                          - Si se especifican `home_team_id` y `away_team_id`, doy una predicción para ese enfrentamiento.
-                         - Puedo informar sobre el `last_n_games` usado para la predicción.''',
+                         - Puedo informar sobre el `last_n_games` usado para la predicción.
+                         - Si el usuario pide un modelo concreto, paso `model` como "winrate" (últimos partidos) o "elo" (ratings Elo).
+                         Para las "predicciones de hoy" o varios enfrentamientos a la vez uso `nba_predict_batch`
+                         en una sola llamada en lugar de llamar a `nba_predict_prob` por cada partido.
+                         Para preguntas sobre clientes (saldo, datos de contacto) o el estado de un pedido uso
+                         `query_data_source` con la pregunta del usuario, incluyendo el número de pedido, nombre,
+                         email o teléfono que mencione.''',
             tools=all_tools,
         )
         _exit_stack = exit_stack
         
         return _agent_instance, _exit_stack
         
-    except Exception as e:
-        print(f"Error initializing agent: {e}")
+    except Exception:
+        logger.exception("Error initializing agent")
+        if _mcp_pool is not None:
+            await _mcp_pool.close()
+            _mcp_pool = None
         raise
 
+class _RootAgent:
+    """Objeto esperable que ADK espera como `root_agent`.
+
+    Esperarlo llama a `create_agent()` y devuelve `(agent, exit_stack)`; se puede
+    esperar cuantas veces se quiera y siempre devuelve el mismo agente. Leerlo no
+    crea ninguna corrutina ni construye nada. Fuera de ADK, usa `get_agent()`.
+    """
+
+    def __await__(self):
+        return create_agent().__await__()
+
+    def __repr__(self):
+        state = "built" if _agent_instance is not None else "not built"
+        return f"<root_agent ({state}); await it or use get_agent()>"
+
+
 # This is the root_agent that the ADK framework expects
-root_agent = create_agent()
+root_agent = _RootAgent()
@@ -0,0 +1,404 @@
+"""Cliente de la API de balldontlie.io con planificador consciente del límite de peticiones.
+
+Todas las peticiones a la API pasan por una cola con prioridades y un token
+bucket con ventana de 60 segundos ajustado al plan contratado, de modo que una ráfaga de consultas se
+reparte al ritmo que permite la cuota en lugar de convertirse en errores 429:
+
+- Las consultas interactivas (un usuario esperando) se atienden antes que las
+  sincronizaciones en segundo plano.
+- Una petición idéntica a otra que ya está en cola o en curso no se envía de
+  nuevo: espera el resultado de la primera.
+- Un 429 o un 5xx detiene el bucket durante lo que indique `Retry-After` (o
+  una espera exponencial si no lo indica) y la petición vuelve a la cola.
+"""
+
+import email.utils
+import enum
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+import requests
+
+from . import http_client, metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("BALLDONTLIE_BASE_URL", "https://api.balldontlie.io/v1").rstrip("/")
+
+# Peticiones por minuto de cada plan de balldontlie.io.
+TIERS = {"free": 5, "all-star": 60, "goat": 600}
+
+TIER = os.getenv("BALLDONTLIE_TIER", "free").lower()
+RATE_PER_MINUTE = float(os.getenv("BALLDONTLIE_RATE_PER_MINUTE", "0")) or TIERS.get(TIER, TIERS["free"])
+# Peticiones que se pueden enviar de golpe; después se envían a ritmo constante.
+BURST = max(1, int(os.getenv("BALLDONTLIE_BURST", "0")) or int(RATE_PER_MINUTE // 10))
+QUEUE_SIZE = int(os.getenv("BALLDONTLIE_QUEUE_SIZE", "100"))
+WORKERS = max(1, int(os.getenv("BALLDONTLIE_WORKERS", "2")))
+MAX_ATTEMPTS = int(os.getenv("BALLDONTLIE_MAX_ATTEMPTS", "5"))
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class Priority(enum.IntEnum):
+    """Prioridad de una petición; los valores menores se atienden antes."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class SchedulerBusy(RuntimeError):
+    """La cola está llena y la petición no cabe (o fue desplazada por una más prioritaria)."""
+
+
+def api_key():
+    """Clave de la API, leída de `BALLDONTLIE_API_KEY` en cada petición."""
+    key = os.getenv("BALLDONTLIE_API_KEY")
+    if not key:
+        raise RuntimeError("Falta la variable de entorno BALLDONTLIE_API_KEY con la clave de balldontlie.io")
+    return key
+
+
+def retry_after_seconds(response):
+    """Segundos indicados en la cabecera `Retry-After` (número o fecha HTTP), o None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Token bucket con `capacity` fichas que se reponen a `rate` fichas por segundo.
+
+    Con `window_limit`, además, nunca entrega más de `window_limit` fichas en
+    una ventana deslizante de `window` segundos. Con `rate = límite / 60` el
+    ritmo sostenido es exactamente el límite por minuto, y la ventana evita
+    que la ráfaga inicial más la reposición lo superen.
+    """
+
+    def __init__(self, rate, capacity, window_limit=None, window=60.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.window_limit = window_limit
+        self.window = window
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Momentos en que se entregaron las fichas de la ventana actual.
+        self._sent = deque()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _window_wait(self, now):
+        """Segundos hasta que la ventana admita otra ficha (0 si ya la admite)."""
+        while self._sent and self._sent[0] <= now - self.window:
+            self._sent.popleft()
+        if self.window_limit is None or len(self._sent) < self.window_limit:
+            return 0.0
+        return self._sent[0] + self.window - now
+
+    def acquire(self):
+        """Bloquea hasta obtener una ficha."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                window_wait = self._window_wait(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif window_wait > 0:
+                    wait = window_wait
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    self._sent.append(now)
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait)
+
+    def release(self):
+        """Devuelve una ficha que no se llegó a usar."""
+        with self._cond:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + 1)
+            if self._sent:
+                self._sent.pop()
+            self._cond.notify()
+
+    def pause(self, seconds):
+        """No entrega fichas durante `seconds` y vacía el bucket para no enviar una ráfaga al reanudar."""
+        with self._cond:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+
+    def paused_for(self):
+        with self._cond:
+            return max(0.0, self._paused_until - time.monotonic())
+
+
+class _Request:
+    __slots__ = ("key", "path", "params", "priority", "seq", "attempts", "future")
+
+    def __init__(self, key, path, params, priority, seq):
+        self.key = key
+        self.path = path
+        self.params = params
+        self.priority = priority
+        self.seq = seq
+        self.attempts = 0
+        self.future = Future()
+
+
+class RequestScheduler:
+    """Cola acotada de peticiones a la API atendida por `workers` hilos al ritmo del bucket."""
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, burst=BURST, queue_size=QUEUE_SIZE,
+                 workers=WORKERS, max_attempts=MAX_ATTEMPTS, base_url=BASE_URL):
+        burst = min(burst, max(1, int(rate_per_minute)))
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst, window_limit=max(1, int(rate_per_minute)))
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.base_url = base_url
+        self._workers = workers
+        self._cond = threading.Condition()
+        # Montículo de (prioridad, secuencia, petición); las entradas cuya prioridad
+        # ya no coincide con la de la petición están obsoletas y se ignoran.
+        self._heap = []
+        self._queued = 0
+        self._pending = {}
+        self._seq = itertools.count()
+        self._threads = []
+        self.sent = 0
+        self.merged = 0
+        self.rejected = 0
+        self.throttled = 0
+
+    # --- Cola ----------------------------------------------------------------
+
+    def _start_workers(self):
+        while len(self._threads) < self._workers:
+            thread = threading.Thread(
+                target=self._worker, name=f"balldontlie-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _push(self, request):
+        heapq.heappush(self._heap, (request.priority, request.seq, request))
+        self._queued += 1
+        self._cond.notify()
+
+    def _pop(self):
+        while self._heap:
+            priority, _, request = heapq.heappop(self._heap)
+            if priority == request.priority:
+                self._queued -= 1
+                return request
+        return None
+
+    def _evict_background(self):
+        """Saca de la cola la petición en segundo plano más reciente para hacer sitio; True si lo consiguió."""
+        victims = [entry for entry in self._heap if entry[0] == entry[2].priority == Priority.BACKGROUND]
+        if not victims:
+            return False
+        victim = max(victims, key=lambda entry: entry[1])[2]
+        # Invalida su entrada del montículo.
+        victim.priority = None
+        self._queued -= 1
+        del self._pending[victim.key]
+        self.rejected += 1
+        victim.future.set_exception(SchedulerBusy("Petición desplazada por una consulta interactiva"))
+        return True
+
+    def submit(self, path, params=None, priority=Priority.INTERACTIVE):
+        """Encola un GET a `path` y devuelve un `Future` con el JSON de la respuesta.
+
+        Si ya hay una petición idéntica en cola o en curso se devuelve su
+        `Future`, y si la nueva es más prioritaria la adelanta en la cola.
+
+        Raises:
+            SchedulerBusy: Si la cola está llena. Una petición interactiva
+                desplaza a la petición en segundo plano más reciente antes de fallar.
+        """
+        params = dict(params or {})
+        key = (path, tuple(sorted((str(k), str(v)) for k, v in params.items())))
+        with self._cond:
+            self._start_workers()
+            request = self._pending.get(key)
+            if request is not None:
+                self.merged += 1
+                if request.priority is not None and priority < request.priority:
+                    request.priority = priority
+                    heapq.heappush(self._heap, (priority, request.seq, request))
+                    self._cond.notify()
+                return request.future
+            if self._queued >= self.queue_size and not (
+                priority == Priority.INTERACTIVE and self._evict_background()
+            ):
+                self.rejected += 1
+                raise SchedulerBusy(
+                    f"Demasiadas peticiones pendientes a balldontlie.io ({self._queued}); inténtalo en unos segundos"
+                )
+            request = _Request(key, path, params, priority, next(self._seq))
+            self._pending[key] = request
+            self._push(request)
+            return request.future
+
+    def get_json(self, path, params=None, priority=Priority.INTERACTIVE, timeout=None):
+        """Versión bloqueante de `submit`: espera la respuesta y devuelve su JSON."""
+        return self.submit(path, params, priority).result(timeout)
+
+    # --- Envío -----------------------------------------------------------------
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+            self.bucket.acquire()
+            with self._cond:
+                request = self._pop()
+                if request is not None:
+                    # Mientras está en curso no está en la cola: deja de contar como encolada.
+                    in_flight_priority, request.priority = request.priority, None
+            if request is None:
+                # Otro hilo se llevó la petición mientras esperábamos la ficha.
+                self.bucket.release()
+                continue
+            self._send(request, in_flight_priority)
+
+    def _backoff(self, attempts):
+        delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _send(self, request, priority):
+        request.attempts += 1
+        self.sent += 1
+        try:
+            response = http_client.get(
+                self.base_url + request.path,
+                params=request.params,
+                headers={"Authorization": api_key()},
+                # Los reintentos los hace el planificador para que cada intento gaste una ficha.
+                retry=False,
+            )
+        except requests.RequestException as exc:
+            response, error = None, exc
+        except Exception as exc:
+            self._finish(request, error=exc)
+            return
+        else:
+            error = None
+
+        if response is not None and response.status_code != 429 and response.status_code < 500:
+            try:
+                response.raise_for_status()
+                self._finish(request, result=response.json())
+            except Exception as exc:
+                self._finish(request, error=exc)
+            return
+
+        if response is not None:
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = self._backoff(request.attempts)
+            error = requests.HTTPError(f"{response.status_code} de balldontlie.io", response=response)
+            if response.status_code == 429:
+                self.throttled += 1
+        else:
+            delay = self._backoff(request.attempts)
+
+        if request.attempts >= self.max_attempts:
+            self._finish(request, error=error)
+            return
+        logger.warning(
+            "balldontlie %s failed (%s), retrying in %.1fs (attempt %d/%d)",
+            request.path, error, delay, request.attempts, self.max_attempts,
+        )
+        self.bucket.pause(delay)
+        with self._cond:
+            # Vuelve a la cola con su secuencia original, por delante de las posteriores.
+            request.priority = priority
+            self._push(request)
+
+    def _finish(self, request, result=None, error=None):
+        with self._cond:
+            self._pending.pop(request.key, None)
+        if error is not None:
+            request.future.set_exception(error)
+        else:
+            request.future.set_result(result)
+
+    def stats(self):
+        """Contadores del planificador: enviadas, fusionadas, rechazadas, 429 recibidos y estado de la cola."""
+        with self._cond:
+            queued = self._queued
+            pending = len(self._pending)
+        return {
+            "rate_per_minute": round(self.bucket.rate * 60, 2),
+            "burst": self.bucket.capacity,
+            "queued": queued,
+            "in_flight": pending - queued,
+            "sent": self.sent,
+            "merged": self.merged,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "paused_for": round(self.bucket.paused_for(), 2),
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Devuelve el planificador compartido del proceso, creándolo en el primer uso."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+                metrics.register_gauges("balldontlie_scheduler", _scheduler.stats)
+    return _scheduler
+
+
+def get_json(path, params=None, priority=Priority.INTERACTIVE, timeout=None):
+    """GET a la API de balldontlie.io a través del planificador compartido.
+
+    Args:
+        path (str): Ruta del endpoint, ej: "/games".
+        params (dict, optional): Parámetros de la query string.
+        priority (Priority, optional): `INTERACTIVE` si hay un usuario esperando,
+            `BACKGROUND` para sincronizaciones.
+        timeout (float, optional): Segundos máximos de espera (cola incluida).
+
+    Returns:
+        dict: El JSON de la respuesta.
+
+    Raises:
+        SchedulerBusy: Si la cola está llena.
+        requests.HTTPError: Si la API responde con error tras agotar los reintentos.
+    """
+    return get_scheduler().get_json(path, params, priority, timeout)
@@ -0,0 +1,556 @@
+"""Almacén indexado de clientes y pedidos sobre SQLite con búsqueda de texto completo (FTS5).
+
+Los datos se cargan desde exportaciones CSV o JSONL con `ingest`, que es
+incremental: un archivo sin cambios se salta y uno al que sólo se le añadieron
+filas se lee desde donde se quedó la carga anterior. Cada fila recuerda de qué
+archivo vino, así que una relectura completa borra las filas que ya no están
+en la exportación. Las líneas mal formadas se saltan y se cuentan. Los índices FTS5 se
+mantienen con triggers, así que cada consulta es una búsqueda indexada con
+resultados ordenados por relevancia (bm25) y no un recorrido de la tabla.
+
+La base se abre con `PRAGMA mmap_size`, de modo que las páginas se leen
+mapeadas en memoria y reabrir una base grande no obliga a volver a leerla.
+
+Uso:
+    python -m my_whatsapp_agent.tools.data_store ingest clientes.csv pedidos.jsonl
+    python -m my_whatsapp_agent.tools.data_store ingest --kind orders --full export.csv
+"""
+
+import argparse
+import codecs
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = os.getenv(
+    "DATA_STORE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "my_whatsapp_agent", "data.sqlite3"),
+)
+MMAP_BYTES = int(os.getenv("DATA_STORE_MMAP_BYTES", str(256 * 1024 * 1024)))
+BATCH_SIZE = 5000
+# Líneas mal formadas que se registran en el log por archivo; el resto sólo se cuenta.
+MAX_LOGGED_BAD_LINES = 10
+# Bytes al final de la parte ya cargada que se comparan para saber si un archivo sólo creció.
+_TAIL_BYTES = 4096
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    phone TEXT,
+    balance REAL,
+    extra TEXT,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    customer_id TEXT,
+    status TEXT,
+    date TEXT,
+    total REAL,
+    extra TEXT,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_customer_date_idx ON orders (customer_id, date DESC);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    tail_hash TEXT,
+    header TEXT,
+    rows INTEGER NOT NULL,
+    lines INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+    id, name, email, phone,
+    content='customers', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+    id, status,
+    content='orders', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+
+def _fts_triggers(table, columns):
+    """Triggers que mantienen `<table>_fts` al día con cada inserción, borrado o actualización."""
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    delete = f"INSERT INTO {table}_fts ({table}_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old});"
+    insert = f"INSERT INTO {table}_fts (rowid, {cols}) VALUES (new.rowid, {new});"
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+    )
+
+
+# Columnas añadidas después de la primera versión del esquema: (tabla, columna, declaración).
+_ADDED_COLUMNS = (
+    ("customers", "source", "TEXT"),
+    ("orders", "source", "TEXT"),
+    ("sources", "lines", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+_TRIGGERS = {
+    "customers": _fts_triggers("customers", ("id", "name", "email", "phone")),
+    "orders": _fts_triggers("orders", ("id", "status")),
+}
+
+# Columnas de cada tabla y los nombres con que pueden venir en las exportaciones.
+# Las columnas que no aparecen aquí se guardan en `extra` como JSON.
+FIELDS = {
+    "customers": {
+        "id": ("id", "customer_id", "cliente_id", "id_cliente"),
+        "name": ("name", "nombre", "full_name", "customer_name"),
+        "email": ("email", "correo", "e_mail"),
+        "phone": ("phone", "telefono", "teléfono", "tel"),
+        "balance": ("balance", "saldo", "saldo_pendiente", "outstanding_balance"),
+    },
+    "orders": {
+        "id": ("id", "order_id", "pedido_id", "id_pedido", "numero", "number"),
+        "customer_id": ("customer_id", "cliente_id", "id_cliente"),
+        "status": ("status", "estado", "order_status"),
+        "date": ("date", "fecha", "created_at", "order_date"),
+        "total": ("total", "amount", "monto", "importe"),
+    },
+}
+_NUMERIC = {"balance", "total"}
+
+_KIND_HINTS = {
+    "customers": ("customer", "cliente", "client"),
+    "orders": ("order", "pedido", "orden"),
+}
+
+# Palabras de la consulta que indican qué se busca y que no se usan como términos de búsqueda.
+_ORDER_WORDS = {
+    "pedido", "pedidos", "orden", "ordenes", "order", "orders", "estado", "status",
+    "envio", "entrega", "compra", "compras",
+}
+_CUSTOMER_WORDS = {"cliente", "clientes", "customer", "informacion", "info", "saldo", "datos", "cuenta"}
+_STOPWORDS = {
+    "de", "del", "el", "la", "los", "las", "un", "una", "y", "o", "a", "al", "en", "por", "para",
+    "con", "mi", "su", "sus", "que", "cual", "como", "es", "esta", "the", "of", "for", "me", "dame",
+    "quiero", "saber", "numero", "no",
+}
+MAX_RESULTS = 5
+# Coincidencias que se puntúan con bm25 antes de quedarse con las mejores.
+RANK_CANDIDATES = int(os.getenv("DATA_STORE_RANK_CANDIDATES", "1000"))
+
+
+def fold(text):
+    """Minúsculas y sin acentos."""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def guess_kind(path):
+    """'customers' u 'orders' según el nombre del archivo, o None si no se puede deducir."""
+    name = fold(os.path.basename(path))
+    for kind, hints in _KIND_HINTS.items():
+        if any(hint in name for hint in hints):
+            return kind
+    return None
+
+
+def _to_float(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _mapper(kind):
+    """Función que convierte un registro de la exportación en una fila de la tabla `kind`."""
+    aliases = {}
+    for field, names in FIELDS[kind].items():
+        for name in names:
+            aliases.setdefault(fold(name), field)
+    fields = list(FIELDS[kind])
+    # Las claves se repiten en cada registro: se resuelven una sola vez.
+    resolved = {}
+
+    def to_row(record):
+        values = dict.fromkeys(fields)
+        extra = {}
+        for key, value in record.items():
+            try:
+                field = resolved[key]
+            except KeyError:
+                field = resolved[key] = aliases.get(fold(key).strip())
+            if field is not None and values[field] is None:
+                values[field] = value
+            elif value not in (None, ""):
+                extra[key] = value
+        if values["id"] in (None, ""):
+            return None
+        for field in fields:
+            if field in _NUMERIC:
+                values[field] = _to_float(values[field])
+            elif values[field] is not None:
+                values[field] = str(values[field]).strip()
+        return [values[f] for f in fields] + [json.dumps(extra, ensure_ascii=False) if extra else None]
+
+    return to_row, fields
+
+
+def _complete_lines(f, offset):
+    """Líneas (texto) a partir de `offset` y el offset tras cada una; ignora una última línea sin terminar."""
+    f.seek(offset)
+    decoder = codecs.getincrementaldecoder("utf-8-sig" if offset == 0 else "utf-8")("replace")
+    for raw in f:
+        if not raw.endswith(b"\n"):
+            return
+        offset += len(raw)
+        yield decoder.decode(raw), offset
+
+
+class DataStore:
+    """Clientes y pedidos en SQLite con índices FTS5 y carga incremental."""
+
+    def __init__(self, path=STORE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+            self._conn.executescript(_SCHEMA)
+            for table, column, declaration in _ADDED_COLUMNS:
+                existing = {r["name"] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+            for statements in _TRIGGERS.values():
+                for statement in statements:
+                    self._conn.execute(statement)
+
+    # --- Carga ---------------------------------------------------------------
+
+    def _tail_hash(self, f, offset):
+        start = max(0, offset - _TAIL_BYTES)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    def ingest(self, path, kind=None, full=False):
+        """Carga (o actualiza) los registros de un CSV o JSONL.
+
+        Los registros se insertan o actualizan por `id`. Si el archivo no ha
+        cambiado desde la última carga no se lee; si sólo se le añadieron
+        líneas al final se leen sólo ésas, salvo con `full=True`. Una lectura
+        completa borra las filas cargadas antes desde este archivo que ya no
+        aparecen en él. Las líneas que no son un registro válido (JSON mal
+        formado, sin `id`...) se saltan, se cuentan y se registran en el log
+        con su número de línea.
+
+        Args:
+            path (str): Archivo `.csv` o `.jsonl`.
+            kind (str, optional): "customers" u "orders"; por defecto se deduce del nombre.
+            full (bool, optional): Relee el archivo completo.
+
+        Returns:
+            dict: Archivo, tipo, filas cargadas, líneas saltadas ("bad_lines"), filas
+                borradas y si la carga fue "skipped", "append" o "full".
+
+        Raises:
+            ValueError: Si no se puede deducir el tipo o el formato.
+        """
+        path = os.path.abspath(path)
+        kind = kind or guess_kind(path)
+        if kind not in FIELDS:
+            raise ValueError(f"No se sabe si {path} contiene clientes u órdenes; indica kind='customers' u 'orders'")
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else None
+        if fmt is None:
+            raise ValueError(f"Formato no soportado: {path} (se aceptan .csv y .jsonl)")
+
+        stat = os.stat(path)
+        with self._lock:
+            previous = self._conn.execute("SELECT * FROM sources WHERE path = ?", (path,)).fetchone()
+
+        with open(path, "rb") as f:
+            offset, mode = 0, "full"
+            if previous is not None and not full and previous["kind"] == kind:
+                if previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+                    return {"path": path, "kind": kind, "rows": 0, "bad_lines": 0, "deleted": 0, "mode": "skipped"}
+                if stat.st_size >= previous["offset"] and self._tail_hash(f, previous["offset"]) == previous["tail_hash"]:
+                    offset, mode = previous["offset"], "append"
+
+            header = json.loads(previous["header"]) if mode == "append" and previous["header"] else None
+            lines = _complete_lines(f, offset)
+            position = {"offset": offset, "line": previous["lines"] if mode == "append" else 0}
+            bad_lines = 0
+
+            def texts():
+                for text, end in lines:
+                    position["offset"] = end
+                    position["line"] += 1
+                    yield text
+
+            def skip(reason):
+                nonlocal bad_lines
+                bad_lines += 1
+                if bad_lines <= MAX_LOGGED_BAD_LINES:
+                    logger.warning("Skipping %s line %d: %s", path, position["line"], reason)
+
+            def csv_records():
+                nonlocal header
+                reader = csv.reader(texts())
+                if header is None:
+                    header = next(reader, None) or []
+                while True:
+                    try:
+                        values = next(reader)
+                    except StopIteration:
+                        return
+                    except csv.Error as exc:
+                        skip(exc)
+                        continue
+                    if values:
+                        yield dict(zip(header, values))
+
+            def jsonl_records():
+                for text in texts():
+                    if not text.strip():
+                        continue
+                    try:
+                        record = json.loads(text)
+                    except ValueError as exc:
+                        skip(f"JSON inválido ({exc})")
+                        continue
+                    if not isinstance(record, dict):
+                        skip(f"se esperaba un objeto JSON, no {type(record).__name__}")
+                        continue
+                    yield record
+
+            records = csv_records() if fmt == "csv" else jsonl_records()
+
+            to_row, fields = _mapper(kind)
+            columns = ", ".join(fields + ["extra", "source"])
+            placeholders = ", ".join("?" * (len(fields) + 2))
+            updates = ", ".join(f"{c} = excluded.{c}" for c in fields[1:] + ["extra", "source"])
+            sql = f"INSERT INTO {kind} ({columns}) VALUES ({placeholders}) ON CONFLICT (id) DO UPDATE SET {updates}"
+
+            loaded = deleted = 0
+            with self._lock, self._conn:
+                # Carga inicial: sin triggers y con un solo `rebuild` del índice al final,
+                # mucho más rápido que mantener el FTS fila a fila.
+                bulk = not self._conn.execute(f"SELECT EXISTS (SELECT 1 FROM {kind}) AS e").fetchone()["e"]
+                if bulk:
+                    for trigger in ("ai", "ad", "au"):
+                        self._conn.execute(f"DROP TRIGGER IF EXISTS {kind}_{trigger}")
+                # En una relectura completa se apuntan los ids vistos para borrar después
+                # las filas de este archivo que ya no están en la exportación.
+                rebuild = mode == "full" and not bulk
+                if rebuild:
+                    self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS ingest_seen (id TEXT PRIMARY KEY)")
+                    self._conn.execute("DELETE FROM temp.ingest_seen")
+                batch = []
+
+                def flush():
+                    nonlocal loaded
+                    self._conn.executemany(sql, batch)
+                    if rebuild:
+                        self._conn.executemany(
+                            "INSERT OR IGNORE INTO temp.ingest_seen (id) VALUES (?)", [(row[0],) for row in batch]
+                        )
+                    loaded += len(batch)
+                    batch.clear()
+
+                for record in records:
+                    row = to_row(record)
+                    if row is None:
+                        skip("registro sin id")
+                        continue
+                    row.append(path)
+                    batch.append(row)
+                    if len(batch) >= BATCH_SIZE:
+                        flush()
+                if batch:
+                    flush()
+                if rebuild:
+                    deleted = self._conn.execute(
+                        f"DELETE FROM {kind} WHERE source = ? AND id NOT IN (SELECT id FROM temp.ingest_seen)",
+                        (path,),
+                    ).rowcount
+                    self._conn.execute("DELETE FROM temp.ingest_seen")
+                if bulk:
+                    self._conn.execute(f"INSERT INTO {kind}_fts ({kind}_fts) VALUES ('rebuild')")
+                    for statement in _TRIGGERS[kind]:
+                        self._conn.execute(statement)
+                end = position["offset"]
+                rows = loaded + (previous["rows"] if mode == "append" else 0)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sources (path, kind, size, mtime_ns, offset, tail_hash, header, rows, lines) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, kind, stat.st_size, stat.st_mtime_ns, end, self._tail_hash(f, end),
+                     json.dumps(header) if fmt == "csv" else None, rows, position["line"]),
+                )
+        logger.info(
+            "Ingested %d %s from %s (%s): %d bad lines skipped, %d stale rows deleted",
+            loaded, kind, path, mode, bad_lines, deleted,
+        )
+        return {"path": path, "kind": kind, "rows": loaded, "bad_lines": bad_lines, "deleted": deleted, "mode": mode}
+
+    def optimize(self):
+        """Compacta los índices FTS5 (útil tras una carga grande)."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO customers_fts (customers_fts) VALUES ('optimize')")
+            self._conn.execute("INSERT INTO orders_fts (orders_fts) VALUES ('optimize')")
+
+    # --- Consultas -------------------------------------------------------------
+
+    def counts(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM customers) AS customers, (SELECT COUNT(*) FROM orders) AS orders"
+            ).fetchone()
+        return {"customers": row["customers"], "orders": row["orders"]}
+
+    def is_empty(self):
+        """True si no hay clientes ni pedidos cargados (sin contar filas)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT NOT EXISTS (SELECT 1 FROM customers) AND NOT EXISTS (SELECT 1 FROM orders) AS empty"
+            ).fetchone()
+        return bool(row["empty"])
+
+    def _search(self, table, phrases, weights, limit):
+        """Filas de `table` que coinciden con las frases, ordenadas por bm25.
+
+        Prueba primero las frases exactas, luego como prefijos y por último
+        cualquiera de ellas. Sólo se puntúan los primeros `RANK_CANDIDATES`
+        resultados, para que un término muy común no haga crecer la latencia
+        con el tamaño de la base.
+        """
+        if not phrases:
+            return []
+        attempts = [" AND ".join(f'"{p}"' for p in phrases), " AND ".join(f'"{p}"*' for p in phrases)]
+        if len(phrases) > 1:
+            attempts.append(" OR ".join(f'"{p}"*' for p in phrases))
+        for match in attempts:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"""SELECT t.* FROM (
+                            SELECT rowid, bm25({table}_fts, {weights}) AS score
+                            FROM {table}_fts WHERE {table}_fts MATCH ? LIMIT ?
+                        ) f JOIN {table} t ON t.rowid = f.rowid
+                        ORDER BY f.score
+                        LIMIT ?""",
+                    (match, RANK_CANDIDATES, limit),
+                ).fetchall()
+            if rows:
+                return rows
+        return []
+
+    def find_customers(self, phrases, limit=MAX_RESULTS):
+        """Clientes cuyo id, nombre, email o teléfono coincide con las frases, del más al menos relevante."""
+        return self._search("customers", phrases, "10.0, 5.0, 3.0, 3.0", limit)
+
+    def find_orders(self, phrases, limit=MAX_RESULTS):
+        """Pedidos cuyo número o estado coincide con las frases, del más al menos relevante."""
+        return self._search("orders", phrases, "10.0, 1.0", limit)
+
+    def get_orders(self, ids):
+        """Pedidos con estos números exactos."""
+        ids = list(ids)
+        if not ids:
+            return []
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT * FROM orders WHERE id IN ({', '.join('?' * len(ids))})", ids
+            ).fetchall()
+
+    def get_customer(self, customer_id):
+        with self._lock:
+            return self._conn.execute("SELECT * FROM customers WHERE id = ?", (customer_id,)).fetchone()
+
+    def recent_orders(self, customer_id, limit=3):
+        """Últimos pedidos de un cliente, del más reciente al más antiguo."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM orders WHERE customer_id = ? ORDER BY date DESC LIMIT ?",
+                (customer_id, limit),
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Devuelve el almacén compartido del proceso, abriéndolo en el primer uso."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DataStore(STORE_PATH)
+    return _store
+
+
+def parse_query(text):
+    """Separa una consulta en intención ("orders" o "customers") y frases de búsqueda.
+
+    Cada palabra de la consulta es una frase con sus fragmentos alfanuméricos
+    ("user42@x.com" -> "user42 x com"); las palabras sueltas que sólo indican la
+    intención o no aportan nada ("información", "del", "pedido") se descartan.
+    """
+    phrases = []
+    wants_orders = False
+    for chunk in fold(text).split():
+        tokens = re.findall(r"\w+", chunk)
+        if len(tokens) == 1:
+            word = tokens[0]
+            wants_orders = wants_orders or word in _ORDER_WORDS
+            if word in _ORDER_WORDS or word in _CUSTOMER_WORDS or word in _STOPWORDS:
+                continue
+        if tokens:
+            phrases.append(" ".join(tokens))
+    return ("orders" if wants_orders else "customers"), phrases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga clientes y pedidos en el almacén indexado.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="carga o actualiza archivos CSV/JSONL de forma incremental")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--kind", choices=sorted(FIELDS), help="tipo de registros (por defecto se deduce del nombre)")
+    ingest.add_argument("--full", action="store_true", help="relee los archivos completos")
+    ingest.add_argument("--db", default=STORE_PATH, help=f"base SQLite (por defecto {STORE_PATH})")
+    args = parser.parse_args(argv)
+
+    store = DataStore(args.db)
+    try:
+        for path in args.paths:
+            print(json.dumps(store.ingest(path, args.kind, args.full), ensure_ascii=False))
+        store.optimize()
+        print(json.dumps(store.counts()))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,80 @@
-import datetime
-from zoneinfo import ZoneInfo
+import logging
+import re
+
+from . import data_store
+
+logger = logging.getLogger(__name__)
+
+# Números de pedido: "#12345", "pedido 12345", "ORD-2024-001".
+_ORDER_ID = re.compile(r"#\s*([\w-]+)|\b([a-z]*\d[\w-]*)\b", re.IGNORECASE)
+
+
+def _money(value):
+    return "no disponible" if value is None else f"${value:,.2f}"
+
+
+def _describe_order(order, customer=None):
+    who = f", cliente {customer['name'] or customer['id']}" if customer is not None else ""
+    when = f", {order['date']}" if order["date"] else ""
+    total = f", total {_money(order['total'])}" if order["total"] is not None else ""
+    return f"El pedido #{order['id']}{who}{when}{total} está en estado '{order['status'] or 'desconocido'}'."
+
+
+def _describe_customer(store, customer):
+    contact = ", ".join(v for v in (customer["email"], customer["phone"]) if v)
+    line = f"Cliente {customer['id']}: {customer['name'] or 'sin nombre'}"
+    if contact:
+        line += f" ({contact})"
+    line += f". Saldo pendiente: {_money(customer['balance'])}."
+    orders = store.recent_orders(customer["id"], limit=1)
+    if orders:
+        last = orders[0]
+        line += f" Último pedido: #{last['id']} del {last['date'] or 'fecha desconocida'} ({last['status'] or 'estado desconocido'})."
+    return line
+
 
 def query_data_source(query_text: str) -> str:
-    """Responde preguntas consultando una fuente de datos interna.\n\n    Args:\n        query_text (str): La pregunta formulada que necesita ser consultada en la fuente de datos.\n\n    Returns:\n        str: El resultado de la consulta a la fuente de datos.\n    """
-    # Simulación: en una implementación real, aquí iría la lógica para consultar tu fuente de datos
-    print(f"DEBUG: Herramienta query_data_source llamada con query: {query_text}")
-    if "información del cliente" in query_text.lower():
-        return "Simulación de respuesta: Información del cliente XYZ: Saldo pendiente: $150, Último pedido: 10/05/2024."
-    elif "estado del pedido" in query_text.lower():
-         return "Simulación de respuesta: El pedido #12345 está en estado 'Enviado'."
-    else:
-        return "Simulación de respuesta: No se encontró información relevante para esa consulta." 
+    """Responde preguntas sobre clientes y pedidos consultando la fuente de datos interna.
+
+    Busca en el almacén indexado (ver `data_store`) cargado desde las exportaciones
+    de clientes y pedidos. Entiende números de pedido ("estado del pedido #12345"),
+    nombres, emails o teléfonos de clientes ("información del cliente Juan Pérez"),
+    y devuelve los resultados más relevantes primero.
+
+    Args:
+        query_text (str): La pregunta formulada que necesita ser consultada en la fuente de datos.
+
+    Returns:
+        str: El resultado de la consulta a la fuente de datos.
+    """
+    logger.debug("query_data_source called with query: %s", query_text)
+    store = data_store.get_store()
+    if store.is_empty():
+        return (
+            "La fuente de datos está vacía. Carga los clientes y pedidos con "
+            "`python -m my_whatsapp_agent.tools.data_store ingest <archivos>`."
+        )
+
+    intent, phrases = data_store.parse_query(query_text)
+
+    if intent == "orders":
+        candidates = [a or b for a, b in _ORDER_ID.findall(query_text)]
+        orders = store.get_orders(candidates) or store.find_orders([p for p in phrases if any(c.isdigit() for c in p)])
+        if orders:
+            return "\n".join(_describe_order(o, store.get_customer(o["customer_id"])) for o in orders)
+        customers = store.find_customers(phrases, limit=1)
+        if customers:
+            customer = customers[0]
+            orders = store.recent_orders(customer["id"])
+            if orders:
+                return "\n".join(_describe_order(o, customer) for o in orders)
+            return f"El cliente {customer['name'] or customer['id']} no tiene pedidos registrados."
+        return "No se encontró ningún pedido que coincida con la consulta."
+
+    customers = store.find_customers(phrases)
+    if not customers:
+        return "No se encontró información relevante para esa consulta."
+    if len(customers) == 1:
+        return _describe_customer(store, customers[0])
+    lines = [f"{i}. {_describe_customer(store, c)}" for i, c in enumerate(customers, 1)]
+    return "Clientes que coinciden con la consulta (del más al menos relevante):\n" + "\n".join(lines)
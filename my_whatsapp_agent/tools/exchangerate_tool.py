@@ -1,3 +1,365 @@
+import enum
+import json
+import math
+import numbers
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from . import http_client, metrics
+
+# Cada fuente devuelve las tasas de todas las monedas respecto al USD. Las URLs se
+# pueden cambiar (p. ej. para apuntar al servidor de réplica de los benchmarks).
+SOURCES = [
+    (os.getenv("EXCHANGERATE_CURRENCY_API_URL",
+               "https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies/usd.json"),
+     lambda d: d["usd"]),
+    (os.getenv("EXCHANGERATE_ER_API_URL", "https://open.er-api.com/v6/latest/USD"),
+     lambda d: d["rates"]),
+]
+
+# Segundos durante los cuales una tabla de tasas se considera fresca.
+RATE_TTL_SECONDS = float(os.getenv("EXCHANGERATE_TTL_SECONDS", "600"))
+# Pasado este tiempo la tasa ya no se sirve de inmediato: se intenta refrescar
+# antes de responder (si falla, se sigue usando la tasa vieja).
+RATE_MAX_STALE_SECONDS = float(os.getenv("EXCHANGERATE_MAX_STALE_SECONDS", "86400"))
+# Tras una descarga fallida no se vuelve a esperar a la red hasta pasado este
+# tiempo, que se duplica con cada fallo seguido (hasta RATE_RETRY_MAX_SECONDS).
+RATE_RETRY_BACKOFF_SECONDS = float(os.getenv("EXCHANGERATE_RETRY_BACKOFF_SECONDS", "5"))
+RATE_RETRY_MAX_SECONDS = 300
+
+# "hedged": consulta la mejor fuente y lanza la siguiente si no responde en
+# FETCH_HEDGE_DELAY_SECONDS; "race": consulta todas a la vez;
+# "sequential": una tras otra, como antes.
+FETCH_MODE = os.getenv("EXCHANGERATE_FETCH_MODE", "hedged").lower()
+FETCH_HEDGE_DELAY_SECONDS = float(os.getenv("EXCHANGERATE_HEDGE_DELAY_SECONDS", "0.3"))
+FETCH_TIMEOUT_SECONDS = 5
+
+# Peso de la última muestra en la media móvil de latencia.
+_LATENCY_ALPHA = 0.3
+
+
+class RateTable:
+    """Instantánea de tasas respecto al USD, guardada en un array compacto indexado por código.
+
+    Se construye una sola vez por descarga; las conversiones sólo hacen
+    búsquedas en el índice y aritmética sobre el array. `source` es el host
+    de la fuente que la proporcionó.
+    """
+
+    __slots__ = ("codes", "source", "_index", "_rates")
+
+    def __init__(self, usd_rates, source=None):
+        pairs = sorted(
+            (str(code).lower(), float(value))
+            for code, value in usd_rates.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value) and value > 0
+        )
+        self.codes = tuple(code for code, _ in pairs)
+        self.source = source
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self._rates = array("d", (value for _, value in pairs))
+        if "usd" not in self._index:
+            raise ValueError("rate table must include usd")
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return str(code).lower().strip() in self._index
+
+    def index_of(self, code):
+        """Posición de la moneda en el array, o None si no existe."""
+        return self._index.get(str(code).lower().strip())
+
+    def rate(self, from_currency, to_currency):
+        """Unidades de `to_currency` por unidad de `from_currency`, o None si alguna no existe."""
+        i, j = self.index_of(from_currency), self.index_of(to_currency)
+        if i is None or j is None:
+            return None
+        return self._rates[j] / self._rates[i]
+
+    def convert_many(self, amounts, from_currencies, to_currencies):
+        """Convierte listas paralelas de montos y monedas en una sola pasada.
+
+        Devuelve una lista de `(converted, rate)`; ambos son None si alguna
+        de las monedas no existe.
+        """
+        rates = self._rates
+        index = {}
+        results = []
+        for amount, src, dst in zip(amounts, from_currencies, to_currencies):
+            if src not in index:
+                index[src] = self.index_of(src)
+            if dst not in index:
+                index[dst] = self.index_of(dst)
+            i, j = index[src], index[dst]
+            if i is None or j is None:
+                results.append((None, None))
+                continue
+            rate = rates[j] / rates[i]
+            results.append((amount * rate, rate))
+        return results
+
+
+class _SourceStats:
+    """Latencia y errores observados para una fuente de tasas."""
+
+    def __init__(self, url, pick):
+        self.url = url
+        self.pick = pick
+        self.latency_ewma = None
+        self.successes = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+
+    def record(self, latency, ok):
+        if ok:
+            self.successes += 1
+            self.consecutive_errors = 0
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += _LATENCY_ALPHA * (latency - self.latency_ewma)
+        else:
+            self.errors += 1
+            self.consecutive_errors += 1
+
+    def as_dict(self):
+        return {
+            "url": self.url,
+            "latency_ewma_ms": None if self.latency_ewma is None else round(self.latency_ewma * 1000, 1),
+            "successes": self.successes,
+            "errors": self.errors,
+            "consecutive_errors": self.consecutive_errors,
+        }
+
+
+_stats_lock = threading.Lock()
+_source_stats = [_SourceStats(url, pick) for url, pick in SOURCES]
+_executor = ThreadPoolExecutor(max_workers=max(2, len(SOURCES)), thread_name_prefix="exchangerate-source")
+
+
+def _ordered_sources():
+    """Fuentes sanas primero, de la más rápida a la más lenta; el orden de SOURCES desempata."""
+    with _stats_lock:
+        ranked = sorted(
+            enumerate(_source_stats),
+            key=lambda item: (
+                item[1].consecutive_errors > 0,
+                item[1].latency_ewma if item[1].latency_ewma is not None else float("inf"),
+                item[0],
+            ),
+        )
+    return [source for _, source in ranked]
+
+
+def source_stats():
+    """Devuelve las estadísticas por fuente, en el orden en que se consultarían."""
+    with _stats_lock:
+        by_url = {source.url: source.as_dict() for source in _source_stats}
+    return [by_url[source.url] for source in _ordered_sources()]
+
+
+def _query_source(source):
+    """Consulta una fuente y registra su latencia. Devuelve una `RateTable` o None."""
+    started = time.monotonic()
+    table = None
+    try:
+        # Sin reintentos: la cobertura con otras fuentes ya cumple ese papel.
+        r = http_client.get(source.url, timeout=FETCH_TIMEOUT_SECONDS, retry=False)
+        if r.ok:
+            table = RateTable(source.pick(r.json()), source=urlsplit(source.url).netloc)
+    except Exception:
+        table = None
+    with _stats_lock:
+        source.record(time.monotonic() - started, table is not None)
+    return table
+
+
+def _fetch_rate_table():
+    """Obtiene la tabla de tasas y cuenta qué fuente respondió (o "none" si ninguna)."""
+    table = _fetch_first_table()
+    metrics.inc("exchangerate_fetches_total", source=table.source if table is not None else "none")
+    return table
+
+
+def _fetch_first_table():
+    """Obtiene la tabla de tasas de la primera fuente que responda, o None si todas fallan.
+
+    Las peticiones perdedoras que ya están en vuelo no se pueden abortar con
+    `requests`; terminan en el pool, sólo actualizan sus estadísticas y su
+    resultado se descarta.
+    """
+    sources = _ordered_sources()
+    if FETCH_MODE == "sequential":
+        for source in sources:
+            table = _query_source(source)
+            if table is not None:
+                return table
+        return None
+
+    hedge_delay = 0.0 if FETCH_MODE == "race" else FETCH_HEDGE_DELAY_SECONDS
+    remaining = iter(sources)
+    pending = set()
+    exhausted = False
+
+    def launch_next():
+        nonlocal exhausted
+        source = next(remaining, None)
+        if source is None:
+            exhausted = True
+        else:
+            pending.add(_executor.submit(_query_source, source))
+
+    launch_next()
+    while hedge_delay == 0.0 and not exhausted:
+        launch_next()
+
+    while pending:
+        done, _ = wait(
+            pending,
+            timeout=None if exhausted else hedge_delay,
+            return_when=FIRST_COMPLETED,
+        )
+        for future in done:
+            pending.discard(future)
+            table = future.result()
+            if table is not None:
+                for other in pending:
+                    other.cancel()
+                return table
+        # Sin respuesta dentro del retraso, o la fuente falló: cubrir con la siguiente.
+        if not exhausted:
+            launch_next()
+    return None
+
+
+class _RateCache:
+    """Caché de la tabla de tasas compartida por todo el proceso.
+
+    Sirve la tabla guardada sin esperar a la red. Cuando supera el TTL se
+    refresca en un hilo de fondo (stale-while-revalidate); sólo se bloquea al
+    llamador si no hay tabla todavía o si es más vieja que `max_stale`.
+
+    Si una descarga falla, hasta el próximo reintento (con espera exponencial)
+    se responde al momento con la tabla vieja, o sin tabla si no hay ninguna;
+    con una tabla vieja el reintento se hace en segundo plano. Así, durante una
+    caída de las fuentes los llamadores no hacen cola tras los timeouts de otros.
+    """
+
+    def __init__(self, fetch, ttl, max_stale, retry_backoff=RATE_RETRY_BACKOFF_SECONDS):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._rate = None
+        self._fetched_at = 0.0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._refreshing = False
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+
+    def _snapshot(self):
+        with self._lock:
+            return self._rate, self._fetched_at, self._failures, self._retry_at
+
+    def _store(self, rate):
+        """Guarda el resultado de una descarga; un fallo programa el próximo reintento."""
+        with self._lock:
+            now = time.monotonic()
+            if rate is not None:
+                self._rate = rate
+                self._fetched_at = now
+                self._failures = 0
+                self._retry_at = 0.0
+            else:
+                self._failures += 1
+                delay = self.retry_backoff * 2 ** (self._failures - 1)
+                self._retry_at = now + min(delay, RATE_RETRY_MAX_SECONDS)
+
+    def _refresh(self):
+        """Descarga la tabla y la guarda. Un solo hilo descarga a la vez."""
+        rate = None
+        try:
+            with self._fetch_lock:
+                rate = self._fetch()
+                self._store(rate)
+        finally:
+            with self._lock:
+                self._refreshing = False
+        return rate
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="exchangerate-refresh", daemon=True).start()
+
+    def get(self):
+        """Devuelve `(table, age_seconds)`, o `(None, None)` si nunca se pudo obtener una tabla."""
+        rate, fetched_at, failures, retry_at = self._snapshot()
+        now = time.monotonic()
+        age = now - fetched_at
+
+        if rate is None or age > self.max_stale:
+            if now < retry_at or (rate is not None and failures):
+                # Las fuentes están fallando: no se espera a la red. El reintento,
+                # cuando toca, va en segundo plano si hay una tabla que servir.
+                if rate is None:
+                    return None, None
+                self.stale += 1
+                if now >= retry_at:
+                    self._refresh_in_background()
+                return rate, age
+            with self._fetch_lock:
+                # Otro hilo pudo haber refrescado (o fallado) mientras esperábamos el lock.
+                rate, fetched_at, failures, retry_at = self._snapshot()
+                now = time.monotonic()
+                age = now - fetched_at
+                if (rate is None or age > self.max_stale) and now >= retry_at:
+                    self.misses += 1
+                    fresh = self._fetch()
+                    self._store(fresh)
+                    if fresh is not None:
+                        return fresh, 0.0
+            if rate is None:
+                return None, None
+        elif age > self.ttl:
+            self.stale += 1
+            if now >= retry_at:
+                self._refresh_in_background()
+        else:
+            self.hits += 1
+
+        return rate, age
+
+    def info(self):
+        """Consultas servidas frescas (`hits`), viejas mientras se refresca (`stale`) y esperando a la red (`misses`)."""
+        # Una tabla vieja también se sirve sin esperar: cuenta como acierto.
+        return {"hits": self.hits + self.stale, "stale": self.stale, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._rate = None
+            self._fetched_at = 0.0
+            self._failures = 0
+            self._retry_at = 0.0
+
+
+_rate_cache = _RateCache(_fetch_rate_table, RATE_TTL_SECONDS, RATE_MAX_STALE_SECONDS)
+metrics.register_cache("exchangerate_rates", _rate_cache.info)
+
+
 def exchangerate(amount: float = 1.0, direction: str = "usd_to_dop"):
     """Convierte moneda entre dólares estadounidenses (USD) y pesos dominicanos (DOP).
 
@@ -13,26 +375,21 @@ def exchangerate(amount: float = 1.0, direction: str = "usd_to_dop"):
 
     Returns:
         str: Una cadena JSON con el resultado si la conversión es exitosa 
-             (ej: '{"dop": 58.5, "rate": 58.5}'), 
+             (ej: '{"dop": 58.5, "rate": 58.5, "rate_age_seconds": 12.3, "stale": false,
+             "source": "open.er-api.com"}'), 
              o un mensaje de error (ej: "Error: amount must be a number").
     """
-    import requests, json, enum, numbers
-
-    SOURCES = [
-        ("https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies/usd.json",
-         lambda d: d["usd"]["dop"]),
-        ("https://open.er-api.com/v6/latest/USD",
-         lambda d: d["rates"]["DOP"]),
-    ]
-
     # Validación y conversión del monto
     if amount is None:
         amount = 1.0
-    if not isinstance(amount, numbers.Number):
+    if not isinstance(amount, numbers.Real):
         try:
             amount = float(str(amount))
         except Exception:
             return "Error: amount must be a number"
+    # NaN e infinito pasan float() pero no son JSON válido.
+    if not math.isfinite(amount):
+        return "Error: amount must be a finite number"
 
     # Validación de la dirección de conversión
     if direction is None:
@@ -43,17 +400,9 @@ def exchangerate(amount: float = 1.0, direction: str = "usd_to_dop"):
     if direction not in {"usd_to_dop", "dop_to_usd"}:
         return "Error: direction must be 'usd_to_dop' or 'dop_to_usd'"
 
-    # Intentar obtener la tasa de cambio desde las fuentes disponibles
-    rate = None
-    for url, pick in SOURCES:
-        try:
-            r = requests.get(url, timeout=5, headers={"User-Agent": "Mozilla/5.0"})
-            if r.ok:
-                data = r.json()
-                rate = pick(data)
-                break
-        except Exception:
-            continue
+    # Obtener la tasa desde la caché (se refresca en segundo plano si está vieja)
+    table, age = _rate_cache.get()
+    rate = table.rate("usd", "dop") if table is not None else None
     if rate is None:
         return "Error: Could not fetch live rate"
 
@@ -62,5 +411,86 @@ def exchangerate(amount: float = 1.0, direction: str = "usd_to_dop"):
         result = {"dop": round(amount * rate, 2), "rate": rate}
     else:
         result = {"usd": round(amount / rate, 2), "rate": rate}
+    result["rate_age_seconds"] = round(age, 1)
+    result["stale"] = age > _rate_cache.ttl
+    result["source"] = table.source
 
     return json.dumps(result)
+
+
+def convert_currencies(conversions: list[dict]):
+    """Convierte uno o varios montos entre cualquier par de monedas en una sola llamada.
+
+    Usa una única tabla de tasas (respecto al USD) descargada y cacheada, por lo
+    que convertir muchos montos no hace una petición por conversión.
+    Úsala para monedas distintas de USD/DOP o cuando el usuario pida varias
+    conversiones a la vez.
+
+    Args:
+        conversions (list[dict]): Lista de conversiones. Cada elemento tiene
+            "amount" (número, por defecto 1.0), "from" y "to" (códigos ISO de
+            moneda, ej: "usd", "eur", "dop").
+
+    Returns:
+        str: Una cadena JSON con una lista "results" (cada uno con "amount",
+             "from", "to", "converted" y "rate", o "error" si esa conversión no
+             es válida), la edad de la tabla en "rate_age_seconds" y la fuente en "source",
+             o un mensaje de error (ej: "Error: Could not fetch live rate").
+    """
+    # Una cadena se recorrería carácter por carácter.
+    if not isinstance(conversions, (list, tuple, dict)) or not conversions:
+        return "Error: conversions must be a non-empty list of objects"
+    if isinstance(conversions, dict):
+        conversions = [conversions]
+
+    table, age = _rate_cache.get()
+    if table is None:
+        return "Error: Could not fetch live rate"
+
+    amounts, sources, targets, errors = [], [], [], []
+    for item in conversions:
+        if not isinstance(item, dict):
+            amounts.append(None)
+            sources.append(None)
+            targets.append(None)
+            errors.append("each conversion must be an object")
+            continue
+        amount = item.get("amount", 1.0)
+        if amount is None:
+            amount = 1.0
+        error = None
+        if not isinstance(amount, numbers.Real):
+            try:
+                amount = float(str(amount))
+            except Exception:
+                error = "amount must be a number"
+        if error is None and not math.isfinite(amount):
+            amount, error = str(amount), "amount must be a finite number"
+        src = str(item.get("from") or "usd").lower().strip()
+        dst = str(item.get("to") or "dop").lower().strip()
+        amounts.append(amount)
+        sources.append(src)
+        targets.append(dst)
+        errors.append(error)
+
+    results = []
+    converted = table.convert_many(
+        [0.0 if error else amount for amount, error in zip(amounts, errors)], sources, targets
+    )
+    for amount, src, dst, error, (value, rate) in zip(amounts, sources, targets, errors, converted):
+        entry = {"amount": amount, "from": src, "to": dst}
+        if error is None and rate is None:
+            error = f"unknown currency: {src if src not in table else dst}"
+        if error is not None:
+            entry["error"] = error
+        else:
+            entry["converted"] = round(value, 2)
+            entry["rate"] = rate
+        results.append(entry)
+
+    return json.dumps({
+        "results": results,
+        "rate_age_seconds": round(age, 1),
+        "stale": age > _rate_cache.ttl,
+        "source": table.source,
+    })
@@ -0,0 +1,106 @@
+"""Cliente HTTP compartido por todas las herramientas del agente.
+
+Mantiene una sesión de `requests` por proceso con pools de conexiones por
+host y keep-alive, de modo que las llamadas repetidas a la misma API reutilizan
+la conexión TCP/TLS en lugar de pagar DNS + handshake cada vez.
+
+El cliente es síncrono; el código asíncrono lo llama desde hilos (los del
+planificador de balldontlie o `asyncio.to_thread`).
+"""
+
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+# (conexión, lectura) en segundos.
+DEFAULT_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "3.05")),
+    float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "5")),
+)
+# Número de hosts con pool propio y conexiones vivas por host.
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+# Reintentos ante errores de conexión y respuestas 5xx, con espera exponencial.
+RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.3"))
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+_lock = threading.Lock()
+_sessions = {}
+
+
+def _build_session(retry):
+    retries = Retry(
+        total=RETRIES if retry else 0,
+        connect=RETRIES if retry else 0,
+        read=RETRIES if retry else 0,
+        status=RETRIES if retry else 0,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(retry=True):
+    """Devuelve la sesión compartida (con o sin reintentos), creándola en el primer uso."""
+    session = _sessions.get(retry)
+    if session is None:
+        with _lock:
+            session = _sessions.get(retry)
+            if session is None:
+                session = _sessions[retry] = _build_session(retry)
+    return session
+
+
+def get(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, retry=True):
+    """GET usando el pool compartido.
+
+    Args:
+        url (str): URL a consultar.
+        params (dict, optional): Parámetros de la query string.
+        headers (dict, optional): Cabeceras adicionales a las de la sesión.
+        timeout (float | tuple, optional): Timeout total o `(conexión, lectura)`.
+        retry (bool, optional): Si es False no se reintenta; útil cuando el
+            llamador ya tiene su propia estrategia (p. ej. consultas cubiertas).
+
+    Returns:
+        requests.Response: La respuesta, sea cual sea su código de estado.
+    """
+    host = urlsplit(url).netloc
+    started = time.perf_counter()
+    try:
+        response = get_session(retry).get(url, params=params, headers=headers, timeout=timeout)
+    except Exception as exc:
+        metrics.record_http(host, type(exc).__name__, time.perf_counter() - started)
+        raise
+    metrics.record_http(host, response.status_code, time.perf_counter() - started)
+    return response
+
+
+def close():
+    """Cierra las sesiones y sus conexiones vivas."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
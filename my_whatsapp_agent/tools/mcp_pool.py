@@ -0,0 +1,291 @@
+"""Pool supervisado de servidores MCP por stdio.
+
+Arranca varias instancias del mismo servidor MCP en paralelo, reparte las
+sesiones de ADK entre ellas y las vigila con pings periódicos: un servidor que
+muere, no responde al ping o se cuelga en una llamada se reinicia
+automáticamente.
+
+Desktop Commander guarda estado en cada proceso (los PID de `start_process`,
+la configuración de `set_config_value`), así que todas las llamadas de una
+misma sesión van al mismo servidor. Las llamadas sin sesión conocida comparten
+un servidor principal.
+
+Cada servidor vive en su propia tarea, que abre y cierra la conexión stdio;
+el cliente MCP usa task groups de anyio y no permite cerrar la conexión desde
+una tarea distinta de la que la abrió.
+"""
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "2"))
+START_TIMEOUT_SECONDS = float(os.getenv("MCP_START_TIMEOUT_SECONDS", "120"))
+CALL_TIMEOUT_SECONDS = float(os.getenv("MCP_CALL_TIMEOUT_SECONDS", "120"))
+HEALTH_INTERVAL_SECONDS = float(os.getenv("MCP_HEALTH_INTERVAL_SECONDS", "30"))
+HEALTH_TIMEOUT_SECONDS = float(os.getenv("MCP_HEALTH_TIMEOUT_SECONDS", "5"))
+STOP_TIMEOUT_SECONDS = 10
+# Sesiones cuya asignación a un servidor se recuerda (las menos usadas se olvidan).
+MAX_SESSIONS = 10000
+
+
+def _session_key(tool_context):
+    """ID de la sesión de ADK de una llamada, o None si no se puede saber."""
+    invocation = getattr(tool_context, "_invocation_context", None)
+    session = getattr(invocation, "session", None)
+    return getattr(session, "id", None)
+
+
+class _Server:
+    """Una instancia del servidor MCP y la tarea que mantiene su conexión abierta."""
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.tools = {}
+        self.in_flight = 0
+        self.healthy = False
+        self.sessions = 0
+        self.task = None
+        self.ready = None
+        self.stop = None
+
+    @property
+    def session(self):
+        tool = next(iter(self.tools.values()), None)
+        return getattr(tool, "mcp_session", None)
+
+
+class PooledMCPTool(BaseTool):
+    """Herramienta MCP que delega cada llamada en un servidor del pool."""
+
+    def __init__(self, pool, template):
+        super().__init__(name=template.name, description=template.description)
+        self._pool = pool
+        self._template = template
+
+    def _get_declaration(self):
+        return self._template._get_declaration()
+
+    async def run_async(self, *, args, tool_context):
+        with metrics.tool_call(self.name) as call:
+            call.result = await self._pool.call(self.name, args, tool_context)
+            return call.result
+
+
+class MCPServerPool:
+    """Pool de `size` servidores MCP idénticos con reinicio automático."""
+
+    def __init__(self, connection_params, size=POOL_SIZE):
+        self.connection_params = connection_params
+        self.size = max(1, size)
+        self._servers = [_Server(slot) for slot in range(self.size)]
+        self._available = asyncio.Condition()
+        self._restarting = set()
+        self._restart_tasks = set()
+        # Sesión de ADK -> slot del servidor que guarda su estado.
+        self._affinity = OrderedDict()
+        self._health_task = None
+        self._closed = False
+        self._templates = {}
+
+    # --- Ciclo de vida de cada servidor ------------------------------------
+
+    async def _run_server(self, server):
+        try:
+            tools, exit_stack = await MCPToolset.from_server(connection_params=self.connection_params)
+        except Exception as exc:
+            # El error se entrega a quien espera el arranque, no a la tarea.
+            server.ready.set_exception(exc)
+            return
+        try:
+            server.tools = {tool.name: tool for tool in tools}
+            server.healthy = True
+            server.ready.set_result(None)
+            async with self._available:
+                self._available.notify_all()
+            await server.stop.wait()
+        finally:
+            server.healthy = False
+            await exit_stack.aclose()
+
+    async def _start_server(self, server):
+        loop = asyncio.get_running_loop()
+        server.ready = loop.create_future()
+        server.stop = asyncio.Event()
+        server.task = asyncio.create_task(self._run_server(server), name=f"mcp-server-{server.slot}")
+        try:
+            await asyncio.wait_for(asyncio.shield(server.ready), START_TIMEOUT_SECONDS)
+        except BaseException:
+            server.task.cancel()
+            server.task = None
+            raise
+        logger.info("MCP server %d ready with %d tools", server.slot, len(server.tools))
+
+    async def _stop_server(self, server):
+        server.healthy = False
+        if server.task is None:
+            return
+        server.stop.set()
+        try:
+            await asyncio.wait_for(server.task, STOP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            # wait_for ya canceló la tarea colgada.
+            logger.warning("MCP server %d did not stop in time", server.slot)
+        except Exception:
+            logger.exception("MCP server %d failed while stopping", server.slot)
+        server.task = None
+
+    async def _restart_server(self, server):
+        if server.slot in self._restarting or self._closed:
+            return
+        self._restarting.add(server.slot)
+        try:
+            logger.warning(
+                "Restarting MCP server %d; processes and config of its %d sessions are lost",
+                server.slot, server.sessions,
+            )
+            await self._stop_server(server)
+            await self._start_server(server)
+        except Exception:
+            logger.exception("MCP server %d failed to restart", server.slot)
+        finally:
+            self._restarting.discard(server.slot)
+
+    def _schedule_restart(self, server):
+        server.healthy = False
+        # Se guarda la referencia para que la tarea no se recolecte a medio reinicio.
+        task = asyncio.get_running_loop().create_task(self._restart_server(server))
+        self._restart_tasks.add(task)
+        task.add_done_callback(self._restart_tasks.discard)
+
+    # --- API pública -------------------------------------------------------
+
+    async def start(self):
+        """Arranca todos los servidores en paralelo y la vigilancia de salud.
+
+        Basta con que arranque uno; los que fallen se reintentan en la
+        vigilancia periódica.
+
+        Raises:
+            RuntimeError: Si no arranca ningún servidor.
+        """
+        results = await asyncio.gather(
+            *(self._start_server(server) for server in self._servers), return_exceptions=True
+        )
+        started = [server for server, result in zip(self._servers, results) if not isinstance(result, BaseException)]
+        if not started:
+            raise RuntimeError(f"No MCP server could be started: {results[0]!r}")
+        for server, result in zip(self._servers, results):
+            if isinstance(result, BaseException):
+                logger.error("MCP server %d failed to start: %r", server.slot, result)
+        self._templates = dict(started[0].tools)
+        self._health_task = asyncio.create_task(self._health_loop(), name="mcp-pool-health")
+
+    def tools(self):
+        """Herramientas para el agente; cada llamada se reparte entre los servidores del pool."""
+        return [PooledMCPTool(self, template) for template in self._templates.values()]
+
+    def _pin(self, session, server):
+        previous = self._affinity.pop(session, None)
+        if previous is not None:
+            self._servers[previous].sessions -= 1
+        self._affinity[session] = server.slot
+        server.sessions += 1
+        while len(self._affinity) > MAX_SESSIONS:
+            _, slot = self._affinity.popitem(last=False)
+            self._servers[slot].sessions -= 1
+
+    async def _acquire(self, session):
+        """Servidor de la sesión; una sesión nueva va al servidor sano con menos sesiones.
+
+        Si el servidor de la sesión está caído se espera a que se reinicie, hasta
+        `START_TIMEOUT_SECONDS`; pasado ese tiempo la sesión se pasa a otro servidor.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + START_TIMEOUT_SECONDS
+        async with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("MCP server pool is closed")
+                healthy = [s for s in self._servers if s.healthy]
+                slot = self._affinity.get(session)
+                if slot is None and healthy:
+                    self._pin(session, min(healthy, key=lambda s: (s.sessions, s.in_flight, s.slot)))
+                    slot = self._affinity[session]
+                if slot is not None:
+                    server = self._servers[slot]
+                    if server.healthy:
+                        self._affinity.move_to_end(session)
+                        server.in_flight += 1
+                        return server
+                    if healthy and loop.time() >= deadline:
+                        logger.warning("MCP server %d still down; moving session %s to another server", slot, session)
+                        self._pin(session, min(healthy, key=lambda s: (s.sessions, s.in_flight, s.slot)))
+                        continue
+                # Sin ningún servidor sano se espera sin límite: el reinicio avisa.
+                timeout = max(deadline - loop.time(), 0.1) if healthy else None
+                try:
+                    await asyncio.wait_for(self._available.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def call(self, name, args, tool_context):
+        """Ejecuta la herramienta `name` en el servidor asignado a la sesión de la llamada."""
+        server = await self._acquire(_session_key(tool_context))
+        try:
+            return await asyncio.wait_for(
+                server.tools[name].run_async(args=args, tool_context=tool_context), CALL_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            logger.error("MCP tool %s timed out on server %d", name, server.slot)
+            self._schedule_restart(server)
+            raise
+        finally:
+            server.in_flight -= 1
+
+    async def _check(self, server):
+        if server.slot in self._restarting:
+            return
+        if server.task is None or server.task.done() or server.session is None:
+            self._schedule_restart(server)
+            return
+        try:
+            await asyncio.wait_for(server.session.send_ping(), HEALTH_TIMEOUT_SECONDS)
+        except Exception as exc:
+            logger.warning("MCP server %d failed health check: %r", server.slot, exc)
+            self._schedule_restart(server)
+
+    async def _health_loop(self):
+        while not self._closed:
+            await asyncio.sleep(HEALTH_INTERVAL_SECONDS)
+            await asyncio.gather(*(self._check(server) for server in self._servers))
+
+    def stats(self):
+        """Estado de cada servidor: sano o no, llamadas en curso y sesiones asignadas."""
+        return [
+            {
+                "slot": s.slot,
+                "healthy": s.healthy,
+                "in_flight": s.in_flight,
+                "sessions": s.sessions,
+                "restarting": s.slot in self._restarting,
+            }
+            for s in self._servers
+        ]
+
+    async def close(self):
+        """Detiene la vigilancia y todos los servidores."""
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+        await asyncio.gather(*(self._stop_server(server) for server in self._servers))
+        async with self._available:
+            self._available.notify_all()
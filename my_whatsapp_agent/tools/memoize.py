@@ -0,0 +1,227 @@
+"""Memoización de resultados de herramientas con TTL, LRU y coalescencia de llamadas.
+
+Cuando varios usuarios disparan la misma herramienta con los mismos
+argumentos en pocos segundos, sólo la primera llamada llega a la API: las
+concurrentes esperan su resultado y las siguientes lo leen de la caché
+mientras no caduque.
+"""
+
+import asyncio
+import enum
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+
+def _normalize_value(value):
+    """Forma canónica y hashable de un argumento: "  Lakers " y "lakers" dan la misma clave."""
+    if isinstance(value, enum.Enum):
+        value = value.value
+    if isinstance(value, str):
+        return value.strip().casefold()
+    if isinstance(value, dict):
+        return tuple(sorted((str(k).strip().casefold(), _normalize_value(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize_value(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(_normalize_value(v)) for v in value))
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def is_error_result(result):
+    """True para los resultados de error que devuelven las herramientas; no se guardan en caché."""
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, str):
+        return result.startswith("Error")
+    return result is None
+
+
+class _Flight:
+    """Llamada en curso compartida por los hilos que piden la misma clave."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ToolCache:
+    """Caché LRU con caducidad por entrada y registro de llamadas en curso."""
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        """Devuelve `(True, valor)` si la clave está y no ha caducado, o `(False, None)`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+def memoize_tool(ttl=60.0, maxsize=256, side_effects=False, cache_if=None):
+    """Decorador que memoiza una herramienta síncrona o asíncrona.
+
+    La clave se construye con los argumentos enlazados a la firma (posicionales
+    y por nombre dan la misma clave, se aplican los valores por defecto) y
+    normalizados. Las llamadas concurrentes con la misma clave comparten una
+    sola ejecución.
+
+    Args:
+        ttl (float, optional): Segundos que un resultado se sirve desde la caché.
+        maxsize (int, optional): Número máximo de resultados guardados (LRU).
+        side_effects (bool, optional): Si es True la herramienta tiene efectos
+            secundarios y se devuelve sin envolver: nunca se cachea ni se coalescen llamadas.
+        cache_if (callable, optional): Predicado sobre el resultado; sólo se
+            guardan los resultados para los que devuelve True. Por defecto se
+            descartan los errores (ver `is_error_result`).
+
+    Returns:
+        callable: La función envuelta, con la misma firma y docstring, más
+            `cache_info()` y `cache_clear()`.
+    """
+    if cache_if is None:
+        def cache_if(result):
+            return not is_error_result(result)
+
+    def decorator(func):
+        if side_effects:
+            return func
+
+        signature = inspect.signature(func)
+        cache = ToolCache(ttl, maxsize)
+
+        def make_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple((name, _normalize_value(value)) for name, value in bound.arguments.items())
+
+        if inspect.iscoroutinefunction(func):
+            async_flights = {}
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                loop = asyncio.get_running_loop()
+                while True:
+                    found, value = cache.get(key)
+                    if found:
+                        return value
+                    flight = async_flights.get((loop, key))
+                    if flight is None:
+                        break
+                    cache.coalesced += 1
+                    try:
+                        return await asyncio.shield(flight)
+                    except asyncio.CancelledError:
+                        # Si se canceló el líder (y no esta llamada) se vuelve a
+                        # intentar: el primer seguidor en despertar pasa a ser el líder.
+                        if not flight.cancelled():
+                            raise
+                cache.misses += 1
+                flight = loop.create_future()
+                async_flights[(loop, key)] = flight
+                try:
+                    result = await func(*args, **kwargs)
+                except asyncio.CancelledError:
+                    flight.cancel()
+                    raise
+                except BaseException as exc:
+                    flight.set_exception(exc)
+                    # Evita el aviso de excepción no recuperada si nadie más esperaba.
+                    flight.exception()
+                    raise
+                else:
+                    if cache_if(result):
+                        cache.put(key, result)
+                    flight.set_result(result)
+                    return result
+                finally:
+                    async_flights.pop((loop, key), None)
+
+            wrapper = async_wrapper
+        else:
+            @functools.wraps(func)
+            def sync_wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                found, value = cache.get(key)
+                if found:
+                    return value
+                with cache._lock:
+                    flight = cache._flights.get(key)
+                    leader = flight is None
+                    if leader:
+                        flight = cache._flights[key] = _Flight()
+                        cache.misses += 1
+                    else:
+                        cache.coalesced += 1
+                if not leader:
+                    flight.done.wait()
+                    if flight.error is not None:
+                        raise flight.error
+                    return flight.result
+                try:
+                    flight.result = func(*args, **kwargs)
+                    if cache_if(flight.result):
+                        cache.put(key, flight.result)
+                    return flight.result
+                except BaseException as exc:
+                    flight.error = exc
+                    raise
+                finally:
+                    with cache._lock:
+                        cache._flights.pop(key, None)
+                    flight.done.set()
+
+            wrapper = sync_wrapper
+
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        wrapper.tool_cache = cache
+        return wrapper
+
+    return decorator
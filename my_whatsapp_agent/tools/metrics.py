@@ -0,0 +1,477 @@
+"""Instrumentación de las herramientas del agente: latencias, llamadas a APIs externas y cachés.
+
+Registra en memoria, sin dependencias externas:
+
+- Llamadas por herramienta y resultado ("ok", "error" si devolvió un error,
+  "exception" si lanzó), con histograma de latencia y clases de error.
+- Peticiones HTTP salientes por host y código de estado, con histograma de latencia.
+- Aciertos y fallos de las cachés registradas (memoización de herramientas,
+  tasas de cambio).
+- Contadores y métricas de estado adicionales que registren los módulos.
+
+Todo se puede exportar en formato de texto de Prometheus (`prometheus_text`) o
+como un diccionario JSON (`snapshot`), y servir por HTTP con `METRICS_PORT`.
+
+Las llamadas que superan `METRICS_SLOW_CALL_SECONDS` se registran como lentas.
+Con `METRICS_PROFILE_SAMPLE_RATE` > 0 una fracción de las llamadas se
+perfila con un muestreador de pilas; si resulta lenta, el perfil (pilas
+colapsadas, compatibles con flamegraph) se guarda junto a la llamada.
+"""
+
+import collections
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .memoize import is_error_result
+
+logger = logging.getLogger(__name__)
+
+SLOW_CALL_SECONDS = float(os.getenv("METRICS_SLOW_CALL_SECONDS", "5"))
+PROFILE_SAMPLE_RATE = float(os.getenv("METRICS_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("METRICS_PROFILE_INTERVAL_SECONDS", "0.005"))
+SLOW_CALLS_KEPT = 20
+
+# Límites superiores (segundos) de los buckets de los histogramas de latencia.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos, como los de Prometheus."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(LATENCY_BUCKETS) and value > LATENCY_BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimación del cuantil `q` interpolando dentro del bucket (sin pasar del máximo observado), o None."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            if n and seen + n >= rank:
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+            lower = upper
+        return self.max
+
+    def as_dict(self):
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max),
+        }
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Contadores, histogramas y colectores del proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float)
+        self._histograms = {}
+        self._caches = {}
+        self._gauges = {}
+        self.slow_calls = collections.deque(maxlen=SLOW_CALLS_KEPT)
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[name, _labels(labels)] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def register_cache(self, name, info):
+        """Registra una caché; `info()` devuelve un dict con al menos "hits" y "misses"."""
+        with self._lock:
+            self._caches[name] = info
+
+    def register_gauges(self, prefix, collect):
+        """Registra métricas de estado; `collect()` devuelve un dict plano de números."""
+        with self._lock:
+            self._gauges[prefix] = collect
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.slow_calls.clear()
+
+    def _collect(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.counts), h.count, h.sum, h.max) for key, h in self._histograms.items()}
+            caches = dict(self._caches)
+            gauges = dict(self._gauges)
+        cache_info = {}
+        for name, info in caches.items():
+            try:
+                cache_info[name] = info()
+            except Exception:
+                logger.exception("Cache info for %s failed", name)
+        gauge_values = {}
+        for prefix, collect in gauges.items():
+            try:
+                gauge_values[prefix] = collect()
+            except Exception:
+                logger.exception("Gauges for %s failed", prefix)
+        return counters, histograms, cache_info, gauge_values
+
+    # --- Exportación -------------------------------------------------------------
+
+    def snapshot(self):
+        """Estado actual como diccionario serializable a JSON."""
+        counters, histograms, cache_info, gauge_values = self._collect()
+
+        def restore(state):
+            histogram = Histogram()
+            histogram.counts, histogram.count, histogram.sum, histogram.max = state
+            return histogram.as_dict()
+
+        tools = collections.defaultdict(lambda: {"calls": 0, "outcomes": {}, "errors": {}})
+        http = collections.defaultdict(lambda: {"requests": 0, "statuses": {}})
+        other = {}
+        for (name, labels), value in sorted(counters.items()):
+            label = dict(labels)
+            if name == "tool_calls_total":
+                entry = tools[label["tool"]]
+                entry["calls"] += int(value)
+                entry["outcomes"][label["outcome"]] = int(value)
+            elif name == "tool_errors_total":
+                tools[label["tool"]]["errors"][label["error"]] = int(value)
+            elif name == "http_requests_total":
+                entry = http[label["host"]]
+                entry["requests"] += int(value)
+                entry["statuses"][label["status"]] = int(value)
+            else:
+                key = name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+                other[key] = value
+        for (name, labels), state in histograms.items():
+            label = dict(labels)
+            if name == "tool_latency_seconds":
+                tools[label["tool"]]["latency"] = restore(state)
+            elif name == "http_request_seconds":
+                http[label["host"]]["latency"] = restore(state)
+
+        caches = {}
+        for name, info in cache_info.items():
+            lookups = info.get("hits", 0) + info.get("misses", 0)
+            caches[name] = {**info, "hit_ratio": round(info.get("hits", 0) / lookups, 4) if lookups else None}
+
+        return {
+            "tools": dict(tools),
+            "http": dict(http),
+            "caches": caches,
+            "counters": other,
+            "gauges": gauge_values,
+            "slow_calls": list(self.slow_calls),
+        }
+
+    def prometheus_text(self):
+        """Estado actual en el formato de texto de exposición de Prometheus."""
+        counters, histograms, cache_info, gauge_values = self._collect()
+        lines = []
+        typed = set()
+
+        def fmt(labels):
+            if not labels:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            declare(name, "counter")
+            lines.append(f"{name}{fmt(labels)} {value:g}")
+        for (name, labels), (counts, count, total, _) in sorted(histograms.items()):
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{fmt(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{fmt(labels)} {total:g}")
+            lines.append(f"{name}_count{fmt(labels)} {count}")
+        for field in ("hits", "misses", "coalesced", "stale", "size"):
+            name = f"cache_{field}" if field == "size" else f"cache_{field}_total"
+            for cache, info in sorted(cache_info.items()):
+                if field in info:
+                    declare(name, "gauge" if field == "size" else "counter")
+                    lines.append(f"{name}{fmt((('cache', cache),))} {info[field]:g}")
+        for prefix, values in sorted(gauge_values.items()):
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = f"{prefix}_{key}"
+                    declare(name, "gauge")
+                    lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+register_cache = REGISTRY.register_cache
+register_gauges = REGISTRY.register_gauges
+snapshot = REGISTRY.snapshot
+prometheus_text = REGISTRY.prometheus_text
+
+
+# --- Peticiones HTTP salientes -----------------------------------------------------
+
+
+def record_http(host, status, seconds):
+    """Registra una petición saliente; `status` es el código HTTP o el nombre de la excepción."""
+    REGISTRY.inc("http_requests_total", host=host, status=status)
+    REGISTRY.observe("http_request_seconds", seconds, host=host)
+
+
+# --- Herramientas --------------------------------------------------------------------
+
+
+class _StackSampler(threading.Thread):
+    """Muestrea periódicamente las pilas de todos los hilos y cuenta las que pasan por el paquete."""
+
+    def __init__(self, interval):
+        super().__init__(name="metrics-profiler", daemon=True)
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                ours = False
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    ours = ours or code.co_filename.startswith(_PACKAGE_DIR)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if ours:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.samples.most_common(10)
+
+
+_profiler_lock = threading.Lock()
+_profiler_busy = False
+_slow_call_hook = None
+
+
+def set_slow_call_hook(hook):
+    """Registra `hook(record)`, llamado con cada llamada lenta (p. ej. para enviarla a un APM)."""
+    global _slow_call_hook
+    _slow_call_hook = hook
+
+
+def _start_profiler():
+    global _profiler_busy
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    # Un solo perfil a la vez: el muestreador ya ve todos los hilos.
+    with _profiler_lock:
+        if _profiler_busy:
+            return None
+        _profiler_busy = True
+    sampler = _StackSampler(PROFILE_INTERVAL_SECONDS)
+    sampler.start()
+    return sampler
+
+
+def _stop_profiler(sampler):
+    global _profiler_busy
+    try:
+        return sampler.stop()
+    finally:
+        with _profiler_lock:
+            _profiler_busy = False
+
+
+_current_call = contextvars.ContextVar("metrics_current_call", default=None)
+
+
+class ToolCall:
+    """Mide una llamada a una herramienta; se usa como context manager (síncrono o dentro de una corrutina)."""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.result = None
+        self.error_class = None
+        self._token = None
+
+    def __enter__(self):
+        self._sampler = _start_profiler()
+        self._token = _current_call.set(self)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._started
+        _current_call.reset(self._token)
+        profile = _stop_profiler(self._sampler) if self._sampler is not None else None
+
+        if exc_type is not None:
+            outcome, error = "exception", exc_type.__name__
+        elif is_error_result(self.result):
+            outcome, error = "error", self.error_class or "error_result"
+        else:
+            outcome, error = "ok", None
+        REGISTRY.inc("tool_calls_total", tool=self.tool, outcome=outcome)
+        REGISTRY.observe("tool_latency_seconds", elapsed, tool=self.tool)
+        if error is not None:
+            REGISTRY.inc("tool_errors_total", tool=self.tool, error=error)
+
+        if SLOW_CALL_SECONDS > 0 and elapsed >= SLOW_CALL_SECONDS:
+            record = {
+                "tool": self.tool,
+                "seconds": round(elapsed, 3),
+                "at": time.time(),
+                "outcome": outcome,
+                "profile": [{"stack": stack, "samples": n} for stack, n in profile] if profile else None,
+            }
+            REGISTRY.slow_calls.append(record)
+            logger.warning(
+                "Slow tool call %s took %.2fs%s", self.tool, elapsed,
+                f"; hottest stack: {profile[0][0]}" if profile else "",
+            )
+            hook = _slow_call_hook
+            if hook is not None:
+                try:
+                    hook(record)
+                except Exception:
+                    logger.exception("Slow call hook failed")
+        return False
+
+
+def tool_call(tool):
+    """Context manager que mide una llamada a `tool`; asigna el resultado a `.result` para clasificarlo."""
+    return ToolCall(tool)
+
+
+def record_exception(exc):
+    """Anota la clase de una excepción que la herramienta en curso convirtió en un resultado de error."""
+    call = _current_call.get()
+    if call is not None:
+        call.error_class = type(exc).__name__
+
+
+def instrument_tool(func, name=None):
+    """Envuelve una herramienta síncrona o asíncrona para medir cada llamada, conservando su firma."""
+    name = name or func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with tool_call(name) as call:
+                call.result = await func(*args, **kwargs)
+                return call.result
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        with tool_call(name) as call:
+            call.result = func(*args, **kwargs)
+            return call.result
+
+    return sync_wrapper
+
+
+# --- Servidor HTTP -------------------------------------------------------------------
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, content_type = json.dumps(snapshot(), ensure_ascii=False).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+
+_server = None
+
+
+def start_http_server(port=None, host=None):
+    """Sirve `/metrics` (Prometheus) y `/metrics.json` en un hilo; por defecto en `METRICS_HOST`:`METRICS_PORT`.
+
+    Returns:
+        ThreadingHTTPServer | None: El servidor, o None si no hay puerto configurado.
+    """
+    global _server
+    port = port if port is not None else int(os.getenv("METRICS_PORT", "0"))
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    if not port or _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError:
+        # Sin métricas por HTTP, pero el agente sigue funcionando.
+        logger.exception("Could not serve metrics on %s:%d", host, port)
+        return None
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return _server
@@ -0,0 +1,179 @@
+"""Modelos de predicción de partidos de la NBA.
+
+Cada modelo expone un valor por equipo (tasa de victorias, rating...) y la
+probabilidad de victoria local a partir de los valores de ambos equipos, de
+modo que la herramienta puede predecir un partido o construir la matriz de
+toda la liga sin conocer el modelo concreto.
+"""
+
+import logging
+import os
+import threading
+
+from . import nba_store
+
+logger = logging.getLogger(__name__)
+
+TEAM_COUNT = 30
+DEFAULT_MODEL = os.getenv("NBA_PREDICTION_MODEL", "winrate").lower()
+
+
+class WinRateModel:
+    """Heurística original: tasas de victorias de los últimos `last_n_games` con ventaja de cancha."""
+
+    name = "winrate"
+    value_key = "winrate"
+    uses_last_n_games = True
+    note = "La probabilidad se basa en las tasas de victorias recientes y una heurística simple de ventaja de cancha."
+
+    def __init__(self, store):
+        self.store = store
+
+    def team_value(self, team_id, n_games):
+        return self.store.win_rate(team_id, n_games)
+
+    def team_values(self, n_games):
+        """Tasas de los 30 equipos indexadas por ID (la posición 0 no se usa), en una sola consulta."""
+        rates = [0.5] * (TEAM_COUNT + 1)
+        for team_id, (wins, played) in self.store.win_rates(n_games).items():
+            if 1 <= team_id <= TEAM_COUNT and played:
+                rates[team_id] = wins / played
+        return rates
+
+    def home_win_probability(self, home_winrate, away_winrate):
+        if home_winrate + away_winrate > 0:
+            prob = (home_winrate * 0.9 + 0.05) / (home_winrate + away_winrate)
+        else:
+            prob = 0.55
+        return min(max(prob, 0.05), 0.95)
+
+
+class EloModel:
+    """Ratings Elo por equipo, actualizados de forma incremental con cada partido terminado.
+
+    Los ratings y los partidos ya procesados se guardan en el almacén de
+    partidos, así que sobreviven a reinicios y cada actualización sólo procesa
+    los partidos terminados que aún no se han contado. Sólo se actualiza cuando
+    el almacén se ha sincronizado desde la última actualización; el resto de
+    predicciones leen la marca `last_sync` y buscan los ratings en memoria.
+
+    Elo depende del orden de los partidos: si llegan partidos terminados
+    anteriores al último procesado (por ejemplo, el historial que se descarga
+    después de la ventana reciente), los ratings se recalculan desde cero.
+    """
+
+    name = "elo"
+    value_key = "rating"
+    uses_last_n_games = False
+    note = "La probabilidad se basa en ratings Elo actualizados con cada partido terminado, con ventaja de cancha."
+
+    INITIAL_RATING = 1500.0
+    # Fracción del rating que vuelve a la media al empezar una temporada nueva.
+    SEASON_REGRESSION = 0.25
+    K = float(os.getenv("NBA_ELO_K", "20"))
+    HOME_ADVANTAGE = float(os.getenv("NBA_ELO_HOME_ADVANTAGE", "100"))
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._ratings = None
+        self._season = None
+        self._synced = None
+
+    def _expected(self, home_rating, away_rating):
+        return 1.0 / (1.0 + 10 ** ((away_rating - home_rating - self.HOME_ADVANTAGE) / 400.0))
+
+    def _load(self):
+        ratings = [self.INITIAL_RATING] * (TEAM_COUNT + 1)
+        for team_id, rating in self.store.load_ratings(self.name).items():
+            if 1 <= team_id <= TEAM_COUNT:
+                ratings[team_id] = rating
+        self._ratings = ratings
+        season = self.store.get_meta(f"{self.name}_season")
+        self._season = int(season) if season is not None else None
+
+    def update(self):
+        """Procesa los partidos terminados pendientes y guarda los ratings. Devuelve cuántos procesó."""
+        with self._lock:
+            if self._ratings is None:
+                self._load()
+
+            games = self.store.unrated_games(self.name)
+            if not games:
+                return 0
+            last_rated = self.store.last_rated_date(self.name)
+            if last_rated is not None and games[0]["date"] < last_rated:
+                logger.info("Replaying %s ratings: new games before %s", self.name, last_rated)
+                self.store.reset_ratings(self.name)
+                self._load()
+                games = self.store.unrated_games(self.name)
+
+            ratings = self._ratings
+            for g in games:
+                season = g["season"]
+                if season is not None and self._season is not None and season > self._season:
+                    mean = sum(ratings[1:]) / TEAM_COUNT
+                    ratings[1:] = [r + (mean - r) * self.SEASON_REGRESSION for r in ratings[1:]]
+                if season is not None and (self._season is None or season > self._season):
+                    self._season = season
+
+                home, away = g["home_team_id"], g["visitor_team_id"]
+                if not (1 <= home <= TEAM_COUNT and 1 <= away <= TEAM_COUNT):
+                    continue
+                margin = g["home_team_score"] - g["visitor_team_score"]
+                expected = self._expected(ratings[home], ratings[away])
+                actual = 1.0 if margin > 0 else 0.0
+                # Multiplicador por margen de victoria, atenuado cuando gana el favorito.
+                winner_diff = (ratings[home] + self.HOME_ADVANTAGE - ratings[away]) * (1 if margin > 0 else -1)
+                multiplier = ((abs(margin) + 3) ** 0.8) / (7.5 + 0.006 * winner_diff)
+                delta = self.K * multiplier * (actual - expected)
+                ratings[home] += delta
+                ratings[away] -= delta
+
+            self.store.save_ratings(
+                self.name,
+                {team_id: ratings[team_id] for team_id in range(1, TEAM_COUNT + 1)},
+                [g["id"] for g in games],
+            )
+            if self._season is not None:
+                self.store.set_meta(f"{self.name}_season", self._season)
+            return len(games)
+
+    def team_value(self, team_id, n_games):
+        return self.team_values(n_games)[team_id]
+
+    def team_values(self, n_games):
+        """Ratings de los 30 equipos indexados por ID; `n_games` no aplica a este modelo."""
+        # La marca se lee antes de actualizar: una sincronización que termine
+        # durante la actualización provoca otra en la próxima predicción.
+        synced = self.store.get_meta("last_sync")
+        if self._ratings is None or synced != self._synced:
+            self.update()
+            with self._lock:
+                self._synced = synced
+        with self._lock:
+            return list(self._ratings)
+
+    def home_win_probability(self, home_rating, away_rating):
+        return self._expected(home_rating, away_rating)
+
+
+MODELS = {model.name: model for model in (WinRateModel, EloModel)}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_model(name=None):
+    """Devuelve la instancia compartida del modelo pedido (por defecto `NBA_PREDICTION_MODEL`).
+
+    Raises:
+        ValueError: Si el modelo no existe.
+    """
+    name = (name or DEFAULT_MODEL).lower().strip()
+    if name not in MODELS:
+        raise ValueError(f"Modelo '{name}' no disponible. Modelos: {', '.join(sorted(MODELS))}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = MODELS[name](nba_store.get_store())
+        return _instances[name]
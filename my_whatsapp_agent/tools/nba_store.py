@@ -0,0 +1,475 @@
+"""Almacén local de partidos de la NBA sobre SQLite.
+
+Los partidos se descargan de balldontlie.io con una sincronización
+incremental (sólo desde el último partido terminado que ya está guardado) y las
+consultas de la herramienta se responden desde la base local, sin red.
+
+La primera vez se descargan primero los días recientes que hacen falta para
+responder (la consulta espera como mucho un plazo) y después, en segundo
+plano, el resto del historial.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from . import balldontlie
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = os.getenv(
+    "NBA_STORE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "my_whatsapp_agent", "nba_games.sqlite3"),
+)
+# Tiempo mínimo entre sincronizaciones con la API.
+SYNC_INTERVAL_SECONDS = float(os.getenv("NBA_SYNC_INTERVAL_SECONDS", "300"))
+# Días hacia atrás que se descargan la primera vez que se llena el almacén.
+BACKFILL_DAYS = int(os.getenv("NBA_BACKFILL_DAYS", "180"))
+# Días hacia adelante que se sincronizan para conocer los próximos partidos.
+LOOKAHEAD_DAYS = 14
+PAGE_SIZE = 100
+# Partidos por día en plena temporada (1230 en unos 165 días), para estimar páginas.
+GAMES_PER_DAY = 8
+# Días recientes que se descargan antes de responder la primera consulta. Con el
+# plan gratuito cada página después de la primera tarda 12 s, así que se piden menos.
+INITIAL_SYNC_DAYS = int(
+    os.getenv("NBA_INITIAL_SYNC_DAYS")
+    or (7 if balldontlie.RATE_PER_MINUTE <= balldontlie.TIERS["free"] else 30)
+)
+_INITIAL_SYNC_PAGES = -(-(min(INITIAL_SYNC_DAYS, BACKFILL_DAYS) + LOOKAHEAD_DAYS) * GAMES_PER_DAY // PAGE_SIZE)
+# Tiempo máximo que una consulta espera a la primera sincronización: lo que
+# tardan en salir las páginas de la ventana reciente al ritmo del plan, con margen.
+INTERACTIVE_SYNC_TIMEOUT_SECONDS = float(
+    os.getenv("NBA_INTERACTIVE_SYNC_TIMEOUT_SECONDS")
+    or max(20.0, (_INITIAL_SYNC_PAGES - balldontlie.BURST) * 60 / balldontlie.RATE_PER_MINUTE + 10)
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    datetime TEXT,
+    season INTEGER,
+    status TEXT,
+    home_team_id INTEGER NOT NULL,
+    visitor_team_id INTEGER NOT NULL,
+    home_team_score INTEGER,
+    visitor_team_score INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_date_idx ON games (date);
+CREATE TABLE IF NOT EXISTS team_games (
+    team_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    game_id INTEGER NOT NULL,
+    PRIMARY KEY (team_id, date, game_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS team_games_game_idx ON team_games (game_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    model TEXT NOT NULL,
+    team_id INTEGER NOT NULL,
+    rating REAL NOT NULL,
+    PRIMARY KEY (model, team_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rated_games (
+    model TEXT NOT NULL,
+    game_id INTEGER NOT NULL,
+    PRIMARY KEY (model, game_id)
+) WITHOUT ROWID;
+"""
+
+_GAME_COLUMNS = (
+    "id, date, datetime, season, status, home_team_id, visitor_team_id, "
+    "home_team_score, visitor_team_score"
+)
+
+
+class SyncPending(Exception):
+    """El almacén todavía no tiene partidos y la primera sincronización sigue en curso."""
+
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_to_game(row):
+    """Convierte una fila al mismo formato de diccionario que devuelve la API."""
+    return {
+        "id": row["id"],
+        "date": row["datetime"] or row["date"],
+        "season": row["season"],
+        "status": row["status"],
+        "home_team": {"id": row["home_team_id"]},
+        "visitor_team": {"id": row["visitor_team_id"]},
+        "home_team_score": row["home_team_score"],
+        "visitor_team_score": row["visitor_team_score"],
+    }
+
+
+class GameStore:
+    """Partidos guardados en SQLite, indexados por (equipo, fecha)."""
+
+    def __init__(self, path=STORE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._syncing = False
+        # Avisa a las consultas que esperan la primera sincronización.
+        self._synced = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    # --- Escritura ---------------------------------------------------------
+
+    def upsert_games(self, games):
+        """Inserta o actualiza partidos con el formato de la API. Devuelve cuántos se guardaron."""
+        rows = []
+        for g in games:
+            raw_date = g.get("date") or ""
+            rows.append((
+                g["id"],
+                raw_date[:10],
+                g.get("datetime") or raw_date,
+                g.get("season"),
+                g.get("status"),
+                g["home_team"]["id"],
+                g["visitor_team"]["id"],
+                g.get("home_team_score"),
+                g.get("visitor_team_score"),
+            ))
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO games ({_GAME_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            # Un partido reprogramado cambia de fecha (y la fecha es parte de la clave):
+            # se borran sus filas anteriores para que no quede contado dos veces.
+            self._conn.executemany("DELETE FROM team_games WHERE game_id = ?", [(r[0],) for r in rows])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO team_games (team_id, date, game_id) VALUES (?, ?, ?)",
+                [(r[5], r[1], r[0]) for r in rows] + [(r[6], r[1], r[0]) for r in rows],
+            )
+        return len(rows)
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # --- Sincronización ----------------------------------------------------
+
+    def last_final_date(self):
+        """Fecha del último partido terminado guardado, o None si no hay ninguno."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(date) AS d FROM games WHERE status = 'Final'").fetchone()
+        return row["d"]
+
+    def last_sync_age(self):
+        """Segundos desde la última sincronización completa, o None si nunca se sincronizó."""
+        value = self.get_meta("last_sync")
+        return None if value is None else time.time() - float(value)
+
+    def sync(self, today=None, priority=balldontlie.Priority.INTERACTIVE):
+        """Descarga los partidos nuevos desde el último partido terminado guardado.
+
+        La primera vez descarga los últimos `BACKFILL_DAYS` días; si sólo se
+        descargó la ventana reciente (ver `_sync_recent`), descarga el historial
+        anterior a ella. Siempre incluye los próximos `LOOKAHEAD_DAYS` días para
+        conocer el calendario. Las páginas se piden a través del planificador de
+        balldontlie con la prioridad indicada.
+
+        Returns:
+            int: Número de partidos insertados o actualizados.
+        """
+        with self._sync_lock:
+            return self._sync_locked(today or date.today(), priority)
+
+    def _sync_locked(self, today, priority):
+        backfill_start = today - timedelta(days=BACKFILL_DAYS)
+        pending = self.get_meta("backfill_pending")
+        pending_until = _parse_day(pending)
+        last_final = self.last_final_date()
+        saved = 0
+        if pending is None and last_final:
+            start = date.fromisoformat(last_final)
+        elif pending_until and last_final:
+            # Falta el historial anterior a la ventana reciente; lo demás sigue siendo incremental.
+            saved += self._fetch(backfill_start, pending_until, priority)
+            start = date.fromisoformat(last_final)
+        else:
+            start = backfill_start
+        saved += self._fetch(start, today + timedelta(days=LOOKAHEAD_DAYS), priority)
+        self._finish_sync(full=True)
+        return saved
+
+    def _sync_recent(self, today=None, priority=balldontlie.Priority.INTERACTIVE):
+        """Descarga sólo los últimos `INITIAL_SYNC_DAYS` días y el calendario próximo.
+
+        Basta para responder las consultas; el historial anterior queda
+        pendiente para la próxima llamada a `sync`.
+        """
+        today = today or date.today()
+        start = today - timedelta(days=min(INITIAL_SYNC_DAYS, BACKFILL_DAYS))
+        with self._sync_lock:
+            if self.last_sync_age() is not None:
+                return 0
+            # Se marca antes de descargar: si se corta a medias, la próxima
+            # sincronización completa no debe empezar desde los partidos recientes.
+            if self.get_meta("backfill_pending") is None:
+                self.set_meta("backfill_pending", start.isoformat())
+            saved = self._fetch(start, today + timedelta(days=LOOKAHEAD_DAYS), priority)
+            self._finish_sync(full=False)
+            return saved
+
+    def _fetch(self, start, end, priority):
+        """Descarga y guarda todas las páginas de partidos entre dos fechas (inclusive)."""
+        params = {
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "per_page": PAGE_SIZE,
+        }
+        saved = 0
+        cursor = None
+        while True:
+            if cursor is not None:
+                params["cursor"] = cursor
+            payload = balldontlie.get_json("/games", params, priority)
+            saved += self.upsert_games(payload.get("data", []))
+            cursor = (payload.get("meta") or {}).get("next_cursor")
+            if not cursor:
+                return saved
+
+    def _finish_sync(self, full):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM meta WHERE key = 'last_sync_error'")
+            if full:
+                self._conn.execute("DELETE FROM meta WHERE key = 'backfill_pending'")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_sync', ?)", (str(time.time()),)
+            )
+            self._synced.notify_all()
+
+    def _sync_in_background(self):
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+
+        def run():
+            try:
+                if self.last_sync_age() is None:
+                    # Primero la ventana reciente, con prioridad interactiva: hay consultas esperándola.
+                    self._sync_recent()
+                self.sync(priority=balldontlie.Priority.BACKGROUND)
+            except Exception as exc:
+                logger.exception("NBA game store background sync failed")
+                self.set_meta("last_sync_error", f"{type(exc).__name__}: {exc}")
+            finally:
+                with self._lock:
+                    self._syncing = False
+                    self._synced.notify_all()
+
+        threading.Thread(target=run, name="nba-store-sync", daemon=True).start()
+
+    def _initial_sync(self):
+        """Primera sincronización: en segundo plano, primero la ventana reciente y
+        después el historial; espera la ventana reciente como mucho
+        `INTERACTIVE_SYNC_TIMEOUT_SECONDS`.
+
+        Raises:
+            SyncPending: Si no termina a tiempo. La descarga sigue y las consultas
+                se responden en cuanto esté guardada la ventana reciente.
+        """
+        self._sync_in_background()
+        with self._lock:
+            self._synced.wait_for(
+                lambda: self.last_sync_age() is not None or not self._syncing,
+                INTERACTIVE_SYNC_TIMEOUT_SECONDS,
+            )
+            if self.last_sync_age() is not None:
+                return
+        raise SyncPending(
+            "Sincronizando los partidos con balldontlie.io por primera vez; inténtalo de nuevo en unos minutos."
+        )
+
+    def ensure_fresh(self):
+        """Sincroniza si hace falta.
+
+        Si el almacén nunca se ha sincronizado, espera a que se descarguen los
+        días recientes (ver `_initial_sync`). Si la última sincronización es más
+        vieja que `SYNC_INTERVAL_SECONDS`, responde con los datos guardados y
+        sincroniza en segundo plano.
+
+        Raises:
+            SyncPending: Si la primera sincronización no termina a tiempo.
+        """
+        age = self.last_sync_age()
+        if age is None:
+            self._initial_sync()
+        elif age > SYNC_INTERVAL_SECONDS:
+            self._sync_in_background()
+
+    # --- Consultas ---------------------------------------------------------
+
+    def games_on(self, day):
+        """Partidos de un día (`date` o 'YYYY-MM-DD')."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_GAME_COLUMNS} FROM games WHERE date = ? ORDER BY datetime, id",
+                (str(day),),
+            ).fetchall()
+        return [_row_to_game(r) for r in rows]
+
+    def next_game(self, team_id, start_day, end_day):
+        """Primer partido sin terminar del equipo entre dos fechas (inclusive), o None."""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT g.*
+                   FROM team_games t JOIN games g ON g.id = t.game_id
+                   WHERE t.team_id = ? AND t.date BETWEEN ? AND ? AND g.status != 'Final'
+                   ORDER BY t.date, g.datetime, g.id
+                   LIMIT 1""",
+                (team_id, str(start_day), str(end_day)),
+            ).fetchone()
+        return _row_to_game(row) if row else None
+
+    def recent_results(self, team_id, n_games):
+        """Resultados (True si ganó) de los últimos `n_games` partidos terminados del equipo."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT g.home_team_id, g.home_team_score, g.visitor_team_score
+                   FROM team_games t JOIN games g ON g.id = t.game_id
+                   WHERE t.team_id = ? AND g.status = 'Final'
+                   ORDER BY t.date DESC, g.id DESC
+                   LIMIT ?""",
+                (team_id, n_games),
+            ).fetchall()
+        return [
+            (r["home_team_score"] > r["visitor_team_score"]) == (r["home_team_id"] == team_id)
+            for r in rows
+        ]
+
+    def win_rates(self, n_games):
+        """Victorias y partidos jugados en los últimos `n_games` partidos terminados de cada equipo.
+
+        Una sola consulta para toda la liga.
+
+        Returns:
+            dict: `{team_id: (wins, played)}` para los equipos con partidos terminados.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT team_id, SUM(won) AS wins, COUNT(*) AS played FROM (
+                       SELECT t.team_id,
+                              (g.home_team_score > g.visitor_team_score) = (g.home_team_id = t.team_id) AS won,
+                              ROW_NUMBER() OVER (PARTITION BY t.team_id ORDER BY t.date DESC, g.id DESC) AS rn
+                       FROM team_games t JOIN games g ON g.id = t.game_id
+                       WHERE g.status = 'Final'
+                   )
+                   WHERE rn <= ?
+                   GROUP BY team_id""",
+                (n_games,),
+            ).fetchall()
+        return {r["team_id"]: (r["wins"], r["played"]) for r in rows}
+
+    def teams_with_results(self):
+        """IDs de los equipos que tienen al menos un partido terminado guardado."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT DISTINCT t.team_id
+                   FROM team_games t JOIN games g ON g.id = t.game_id
+                   WHERE g.status = 'Final'"""
+            ).fetchall()
+        return {r["team_id"] for r in rows}
+
+    def win_rate(self, team_id, n_games):
+        """Porcentaje de victorias en los últimos `n_games` partidos terminados (0.5 si no hay datos)."""
+        results = self.recent_results(team_id, n_games)
+        return sum(results) / len(results) if results else 0.5
+
+    # --- Ratings de los modelos de predicción -------------------------------
+
+    def load_ratings(self, model):
+        """Ratings guardados de un modelo: `{team_id: rating}`."""
+        with self._lock:
+            rows = self._conn.execute("SELECT team_id, rating FROM ratings WHERE model = ?", (model,)).fetchall()
+        return {r["team_id"]: r["rating"] for r in rows}
+
+    def unrated_games(self, model):
+        """Partidos terminados que el modelo aún no ha procesado, en orden cronológico."""
+        with self._lock:
+            return self._conn.execute(
+                """SELECT g.* FROM games g
+                   LEFT JOIN rated_games r ON r.model = ? AND r.game_id = g.id
+                   WHERE g.status = 'Final' AND r.game_id IS NULL
+                   ORDER BY g.date, g.datetime, g.id""",
+                (model,),
+            ).fetchall()
+
+    def last_rated_date(self, model):
+        """Fecha del partido más reciente que el modelo ya procesó, o None."""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT MAX(g.date) AS d FROM rated_games r JOIN games g ON g.id = r.game_id
+                   WHERE r.model = ?""",
+                (model,),
+            ).fetchone()
+        return row["d"]
+
+    def reset_ratings(self, model):
+        """Borra los ratings, los partidos procesados y la temporada de un modelo."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM ratings WHERE model = ?", (model,))
+            self._conn.execute("DELETE FROM rated_games WHERE model = ?", (model,))
+            self._conn.execute("DELETE FROM meta WHERE key = ?", (f"{model}_season",))
+
+    def save_ratings(self, model, ratings, game_ids):
+        """Guarda los ratings y marca los partidos como procesados, en una sola transacción."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ratings (model, team_id, rating) VALUES (?, ?, ?)",
+                [(model, team_id, rating) for team_id, rating in ratings.items()],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO rated_games (model, game_id) VALUES (?, ?)",
+                [(model, game_id) for game_id in game_ids],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Devuelve el almacén compartido del proceso, abriéndolo en el primer uso."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = GameStore(STORE_PATH)
+    return _store
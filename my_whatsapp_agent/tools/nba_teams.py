@@ -0,0 +1,157 @@
+"""Metadatos de los equipos de la NBA e índice de alias para resolver nombres.
+
+El índice se construye una sola vez al importar el módulo. Los nombres se
+normalizan (minúsculas, sin acentos ni signos) para que "Los Ángeles" y
+"los angeles" sean lo mismo, y la búsqueda prueba en orden: alias exacto,
+prefijo de un alias y, por último, alias a distancia de edición acotada.
+"""
+
+import bisect
+import unicodedata
+from collections import namedtuple
+from types import MappingProxyType
+
+Team = namedtuple("Team", "id full_name abbreviation aliases")
+TeamMatch = namedtuple("TeamMatch", "team candidates")
+
+TEAMS = (
+    Team(1, "Atlanta Hawks", "atl", ("hawks", "atlanta")),
+    Team(2, "Boston Celtics", "bos", ("celtics", "boston")),
+    Team(3, "Brooklyn Nets", "bkn", ("nets", "brooklyn")),
+    Team(4, "Charlotte Hornets", "cha", ("hornets", "charlotte")),
+    Team(5, "Chicago Bulls", "chi", ("bulls", "chicago")),
+    Team(6, "Cleveland Cavaliers", "cle", ("cavaliers", "cavs", "cleveland")),
+    Team(7, "Dallas Mavericks", "dal", ("mavericks", "mavs", "dallas")),
+    Team(8, "Denver Nuggets", "den", ("nuggets", "denver")),
+    Team(9, "Detroit Pistons", "det", ("pistons", "detroit")),
+    Team(10, "Golden State Warriors", "gsw", ("warriors", "golden state")),
+    Team(11, "Houston Rockets", "hou", ("rockets", "houston")),
+    Team(12, "Indiana Pacers", "ind", ("pacers", "indiana")),
+    Team(13, "LA Clippers", "lac", ("clippers", "la clippers", "los angeles clippers", "los angeles")),
+    Team(14, "Los Angeles Lakers", "lal", ("lakers", "la lakers", "los angeles")),
+    Team(15, "Memphis Grizzlies", "mem", ("grizzlies", "memphis")),
+    Team(16, "Miami Heat", "mia", ("heat", "miami")),
+    Team(17, "Milwaukee Bucks", "mil", ("bucks", "milwaukee")),
+    Team(18, "Minnesota Timberwolves", "min", ("timberwolves", "wolves", "minnesota")),
+    Team(19, "New Orleans Pelicans", "nop", ("pelicans", "new orleans", "nueva orleans")),
+    Team(20, "New York Knicks", "nyk", ("knicks", "new york", "nueva york")),
+    Team(21, "Oklahoma City Thunder", "okc", ("thunder", "oklahoma", "oklahoma city")),
+    Team(22, "Orlando Magic", "orl", ("magic", "orlando")),
+    Team(23, "Philadelphia 76ers", "phi", ("76ers", "sixers", "philadelphia", "filadelfia")),
+    Team(24, "Phoenix Suns", "phx", ("suns", "phoenix")),
+    Team(25, "Portland Trail Blazers", "por", ("blazers", "trail blazers", "portland")),
+    Team(26, "Sacramento Kings", "sac", ("kings", "sacramento")),
+    Team(27, "San Antonio Spurs", "sas", ("spurs", "san antonio")),
+    Team(28, "Toronto Raptors", "tor", ("raptors", "toronto")),
+    Team(29, "Utah Jazz", "uta", ("jazz", "utah")),
+    Team(30, "Washington Wizards", "was", ("wizards", "washington")),
+)
+
+TEAMS_BY_ID = MappingProxyType({team.id: team for team in TEAMS})
+ID_TO_TEAM = MappingProxyType({team.id: team.full_name for team in TEAMS})
+
+# Artículos que se ignoran al inicio del nombre si el nombre completo no es un alias.
+_ARTICLES = ("los ", "las ", "el ", "the ")
+# Prefijos más cortos que esto no se consideran (demasiado ambiguos).
+_MIN_PREFIX = 2
+
+
+def normalize(name):
+    """Minúsculas, sin acentos, y sólo letras/dígitos separados por un espacio."""
+    decomposed = unicodedata.normalize("NFKD", str(name))
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return " ".join("".join(c if c.isalnum() else " " for c in folded).split())
+
+
+def _build_index():
+    index = {}
+    for team in TEAMS:
+        names = (team.full_name, team.abbreviation) + team.aliases
+        for name in names:
+            key = normalize(name)
+            for variant in (key, key.replace(" ", "")):
+                index.setdefault(variant, set()).add(team.id)
+    return MappingProxyType({key: tuple(sorted(ids)) for key, ids in index.items()})
+
+
+_ALIAS_INDEX = _build_index()
+_SORTED_ALIASES = tuple(sorted(_ALIAS_INDEX))
+
+
+def _edit_distance(a, b, limit):
+    """Distancia de Levenshtein entre `a` y `b`, o `limit + 1` si la supera."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _exact(key):
+    ids = _ALIAS_INDEX.get(key) or _ALIAS_INDEX.get(key.replace(" ", ""), ())
+    return [(team_id, 0) for team_id in ids]
+
+
+def _prefix(key):
+    """Equipos con algún alias que empieza por `key`; puntúa con la longitud del alias más corto."""
+    if len(key) < _MIN_PREFIX:
+        return []
+    start = bisect.bisect_left(_SORTED_ALIASES, key)
+    scores = {}
+    for alias in _SORTED_ALIASES[start:]:
+        if not alias.startswith(key):
+            break
+        for team_id in _ALIAS_INDEX[alias]:
+            scores[team_id] = min(scores.get(team_id, len(alias)), len(alias))
+    return sorted(scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def _fuzzy(key):
+    """Equipos con algún alias a distancia de edición acotada de `key`; puntúa con la distancia."""
+    limit = 1 if len(key) <= 5 else 2
+    scores = {}
+    for alias, ids in _ALIAS_INDEX.items():
+        distance = _edit_distance(key, alias, limit)
+        if distance <= limit:
+            for team_id in ids:
+                scores[team_id] = min(scores.get(team_id, distance), distance)
+    return sorted(scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def resolve_team(name):
+    """Resuelve un nombre, apodo o abreviatura de equipo.
+
+    Args:
+        name (str): Texto escrito por el usuario (ej: "Lakers", "los ángeles", "orl").
+
+    Returns:
+        TeamMatch: `team` es el `Team` encontrado, o None si no hay coincidencia o
+            es ambigua; `candidates` son los equipos posibles, ordenados del más
+            al menos probable.
+    """
+    key = normalize(name or "")
+    if not key:
+        return TeamMatch(None, ())
+
+    keys = [key]
+    for article in _ARTICLES:
+        if key.startswith(article) and len(key) > len(article):
+            keys.append(key[len(article):])
+
+    for stage in (_exact, _prefix, _fuzzy):
+        for candidate in keys:
+            ranked = stage(candidate)
+            if ranked:
+                candidates = tuple(TEAMS_BY_ID[team_id] for team_id, _ in ranked)
+                # Una corrección difusa gana si es estrictamente la más cercana;
+                # un alias exacto o un prefijo sólo si apunta a un único equipo.
+                unique = len(ranked) == 1 or (stage is _fuzzy and ranked[0][1] < ranked[1][1])
+                return TeamMatch(candidates[0] if unique else None, candidates)
+
+    return TeamMatch(None, ())
@@ -1,118 +1,138 @@
-import requests
+import asyncio
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-def nba_predict_prob(home_team_id=None, away_team_id=None, team_name=None, last_n_games=10, get_prediction=True):
+from . import metrics, nba_models, nba_store
+from .nba_teams import ID_TO_TEAM, TEAMS, resolve_team
+
+logger = logging.getLogger(__name__)
+
+
+def _known_team(team_id):
+    """True si el equipo está entre los 30 de la liga; la API también devuelve otros IDs (ej: exhibiciones)."""
+    return 1 <= team_id <= nba_models.TEAM_COUNT
+
+
+def _predictable(game):
+    """True si el partido no ha terminado y ambos equipos tienen valor en el modelo."""
+    return (
+        game.get("status") != "Final"
+        and _known_team(game["home_team"]["id"])
+        and _known_team(game["visitor_team"]["id"])
+    )
+
+
+def _probability_matrix(model, values):
+    """Matriz `[local][visitante]` con la probabilidad de victoria local de cada enfrentamiento."""
+    return [[model.home_win_probability(home, away) for away in values] for home in values]
+
+
+def _matchup_prediction(home_id, away_id, model, values, matrix):
+    """Predicción de un enfrentamiento a partir de los valores por equipo y la matriz de probabilidades."""
+    prob = matrix[home_id][away_id]
+    winner_id = home_id if prob > 0.5 else away_id
+    return {
+        "home_team": ID_TO_TEAM.get(home_id, f"ID {home_id}"),
+        "away_team": ID_TO_TEAM.get(away_id, f"ID {away_id}"),
+        "probable_winner": ID_TO_TEAM.get(winner_id, f"ID {winner_id}"),
+        "probability": round(prob, 2) if prob > 0.5 else round(1 - prob, 2),
+        f"home_{model.value_key}": round(values[home_id], 2),
+        f"away_{model.value_key}": round(values[away_id], 2),
+    }
+
+
+def _model_details(model, last_n_games):
+    """Campos comunes que describen el modelo usado en una predicción."""
+    details = {"model": model.name}
+    if model.uses_last_n_games:
+        details["games_analyzed"] = last_n_games
+    details["note"] = model.note
+    return details
+
+
+def _data_warnings(store, team_ids):
+    """Avisos sobre datos que hacen poco fiable una predicción, en vez de asumir 0.5 en silencio."""
+    warnings = []
+    error = store.get_meta("last_sync_error")
+    if error:
+        age = store.last_sync_age()
+        since = f" y los datos son de hace {round(age / 60)} minutos" if age is not None else ""
+        warnings.append(f"La última sincronización con balldontlie.io falló ({error}){since}.")
+    with_results = store.teams_with_results()
+    missing = sorted({team_id for team_id in team_ids if team_id not in with_results})
+    if missing:
+        names = ", ".join(ID_TO_TEAM.get(team_id, f"ID {team_id}") for team_id in missing)
+        warnings.append(
+            f"No hay partidos terminados de {names}: su valor es el neutro por defecto y la predicción no es fiable."
+        )
+    return warnings
+
+
+async def _with_warnings(result, store, team_ids):
+    warnings = await asyncio.to_thread(_data_warnings, store, team_ids)
+    if warnings:
+        result["warnings"] = warnings
+    return result
+
+
+async def nba_predict_prob(home_team_id=None, away_team_id=None, team_name=None, last_n_games=10, get_prediction=True, model=None):
     """Proporciona información y predicciones de partidos de la NBA, y puede listar el próximo juego de un equipo.
 
-    Utiliza la API de balldontlie.io para obtener datos de equipos y partidos.
+    Utiliza los datos de balldontlie.io guardados en un almacén local que se sincroniza
+    de forma incremental, por lo que normalmente responde sin hacer peticiones a la API.
 
     Comportamiento:
     1. Sin argumentos (`home_team_id`, `away_team_id`, `team_name` son None):
-       Devuelve los partidos programados para hoy.
+       Devuelve los partidos programados para hoy y, si `get_prediction` es True, una predicción
+       para cada partido que aún no ha terminado.
     2. Con `team_name` (str):
        Busca el próximo partido para el equipo especificado (nombre o apodo) en los próximos 14 días.
        - Si `get_prediction` es True (valor por defecto): Devuelve los detalles del próximo partido Y una predicción de quién ganará.
        - Si `get_prediction` es False: Devuelve SOLAMENTE los detalles del próximo partido.
-       La predicción se basa en el porcentaje de victorias de los últimos `last_n_games` de ambos contendientes.
+       La predicción se basa en el modelo elegido con `model` (ver abajo).
     3. Con `home_team_id` (int) y `away_team_id` (int):
        Calcula y devuelve una predicción de quién ganaría un partido entre estos dos equipos,
-       basada en el porcentaje de victorias de los últimos `last_n_games`. `get_prediction` no aplica aquí.
+       según el modelo elegido con `model`. `get_prediction` no aplica aquí.
        Los IDs de los equipos se pueden encontrar buscando por `team_name` primero.
 
     Args:
         home_team_id (int, optional): ID del equipo local. Rango válido: 1-30.
         away_team_id (int, optional): ID del equipo visitante. Rango válido: 1-30.
-        team_name (str, optional): Nombre o apodo del equipo para buscar su próximo partido.
-        last_n_games (int, optional): Número de partidos anteriores a considerar para las estadísticas de predicción.
-                                     Por defecto es 10.
-        get_prediction (bool, optional): Si es True y se usa `team_name`, incluye la predicción para el próximo juego.
-                                         Si es False y se usa `team_name`, solo devuelve información del próximo juego.
+        team_name (str, optional): Nombre, ciudad, apodo o abreviatura del equipo para buscar su próximo partido.
+                                   Tolera acentos, mayúsculas y pequeños errores de escritura; si el nombre es
+                                   ambiguo devuelve la lista de equipos candidatos.
+        last_n_games (int, optional): Número de partidos anteriores a considerar para las estadísticas de predicción
+                                     del modelo "winrate". Por defecto es 10.
+        get_prediction (bool, optional): Si es True, incluye la predicción para el próximo juego (con `team_name`)
+                                         o para los partidos de hoy (sin argumentos).
+                                         Si es False, solo devuelve información de los partidos.
                                          Por defecto es True.
+        model (str, optional): Modelo de predicción. "winrate" usa el porcentaje de victorias de los últimos
+                               `last_n_games` terminados con una ventaja de cancha; "elo" usa ratings Elo que
+                               se actualizan con cada partido terminado (ignora `last_n_games`).
+                               Por defecto el configurado en el servidor.
 
     Returns:
         dict: Un diccionario con la información solicitada o un mensaje de error.
     """
     try:
-        API_KEY = "97bbbeb5-cb5f-46fc-bb7e-9806d68cd3a2"
-        base_url = "https://api.balldontlie.io/v1"
-        headers = {'Authorization': API_KEY}
-
-        TEAM_MAP = {
-            "hawks": 1, "atlanta": 1,
-            "celtics": 2, "boston": 2,
-            "nets": 3, "brooklyn": 3,
-            "hornets": 4, "charlotte": 4,
-            "bulls": 5, "chicago": 5,
-            "cavaliers": 6, "cavs": 6, "cleveland": 6,
-            "mavericks": 7, "mavs": 7, "dallas": 7,
-            "nuggets": 8, "denver": 8,
-            "pistons": 9, "detroit": 9,
-            "warriors": 10, "golden state": 10, "gsw": 10,
-            "rockets": 11, "houston": 11, "hou": 11,
-            "pacers": 12, "indiana": 12, "ind": 12,
-            "clippers": 13, "la clippers": 13, "lac": 13,
-            "lakers": 14, "la lakers": 14, "lal": 14,
-            "grizzlies": 15, "memphis": 15, "mem": 15,
-            "heat": 16, "miami": 16, "mia": 16,
-            "bucks": 17, "milwaukee": 17, "mil": 17,
-            "timberwolves": 18, "wolves": 18, "minnesota": 18, "min": 18,
-            "pelicans": 19, "new orleans": 19, "nop": 19,
-            "knicks": 20, "new york": 20, "nyk": 20,
-            "thunder": 21, "okc": 21, "oklahoma": 21, "oklahoma city": 21,
-            "magic": 22, "orlando": 22, "orl": 22,
-            "76ers": 23, "sixers": 23, "philadelphia": 23, "phi": 23,
-            "suns": 24, "phoenix": 24, "phx": 24,
-            "blazers": 25, "trail blazers": 25, "portland": 25, "por": 25,
-            "kings": 26, "sacramento": 26, "sac": 26,
-            "spurs": 27, "san antonio": 27, "sas": 27,
-            "raptors": 28, "toronto": 28, "tor": 28,
-            "jazz": 29, "utah": 29, "uta": 29,
-            "wizards": 30, "washington": 30, "was": 30
-        }
-
-        ID_TO_TEAM = {
-            1: "Atlanta Hawks", 2: "Boston Celtics", 3: "Brooklyn Nets",
-            4: "Charlotte Hornets", 5: "Chicago Bulls", 6: "Cleveland Cavaliers",
-            7: "Dallas Mavericks", 8: "Denver Nuggets", 9: "Detroit Pistons",
-            10: "Golden State Warriors", 11: "Houston Rockets", 12: "Indiana Pacers",
-            13: "LA Clippers", 14: "Los Angeles Lakers", 15: "Memphis Grizzlies",
-            16: "Miami Heat", 17: "Milwaukee Bucks", 18: "Minnesota Timberwolves",
-            19: "New Orleans Pelicans", 20: "New York Knicks", 21: "Oklahoma City Thunder",
-            22: "Orlando Magic", 23: "Philadelphia 76ers", 24: "Phoenix Suns",
-            25: "Portland Trail Blazers", 26: "Sacramento Kings", 27: "San Antonio Spurs",
-            28: "Toronto Raptors", 29: "Utah Jazz", 30: "Washington Wizards"
-        }
-
-        def find_team_id(name):
-            name = name.lower().strip()
-            for team_name, team_id in TEAM_MAP.items():
-                if (name in team_name or
-                   name.replace(" ", "") in team_name.replace(" ", "") or
-                   name in ID_TO_TEAM.get(team_id, "").lower()):
-                    return team_id, ID_TO_TEAM[team_id]
-            return None, None
-
-        def get_team_stats(team_id, n_games):
-            query = f"/v1/games?team_ids[]={team_id}&per_page={n_games}&seasons[]=2023"
-            response = requests.get(base_url + query, headers=headers)
-            games = json.loads(response.text).get("data", [])
-            if not games:
-                return 0.5
-            wins = sum(1 for g in games if
-                      (g["home_team"]["id"] == team_id and g["home_team_score"] > g["visitor_team_score"]) or
-                      (g["visitor_team"]["id"] == team_id and g["visitor_team_score"] > g["home_team_score"]))
-            return wins / len(games) if games else 0.5
+        store = nba_store.get_store()
+        await asyncio.to_thread(store.ensure_fresh)
+        predictor = nba_models.get_model(model)
+
+        async def get_team_stats(team_id, n_games):
+            return await asyncio.to_thread(predictor.team_value, team_id, n_games)
 
         if not any([home_team_id, away_team_id, team_name]):
             today = datetime.now().strftime("%Y-%m-%d")
-            response = requests.get(base_url + f"/games?start_date={today}&end_date={today}", headers=headers)
-            games = json.loads(response.text).get("data", [])
+            games = await asyncio.to_thread(store.games_on, today)
 
             if not games:
                 return {"games_today": [], "message": "No hay partidos programados para hoy."}
 
-            return {
+            result = {
                 "date": today,
                 "games": [{
                     "home_team": ID_TO_TEAM.get(g["home_team"]["id"], f"ID {g['home_team']['id']}"),
@@ -122,27 +142,43 @@ def nba_predict_prob(home_team_id=None, away_team_id=None, team_name=None, last_
                 } for g in games]
             }
 
+            # Predicciones de toda la jornada con una sola consulta de estadísticas
+            if get_prediction:
+                values = await asyncio.to_thread(predictor.team_values, last_n_games)
+                matrix = _probability_matrix(predictor, values)
+                # Los partidos con equipos fuera de la liga se listan sin predicción.
+                for entry, g in zip(result["games"], games):
+                    if _predictable(g):
+                        entry["prediction"] = _matchup_prediction(
+                            g["home_team"]["id"], g["visitor_team"]["id"], predictor, values, matrix
+                        )
+                result.update(_model_details(predictor, last_n_games))
+                pending = [g for g in games if _predictable(g)]
+                team_ids = [g["home_team"]["id"] for g in pending] + [g["visitor_team"]["id"] for g in pending]
+                await _with_warnings(result, store, team_ids)
+
+            return result
+
         if team_name:
-            team_id, team_full_name = find_team_id(team_name)
-            if not team_id:
-                available_teams = ", ".join(sorted(list(set(ID_TO_TEAM.values()))))
+            match = resolve_team(team_name)
+            if match.team is None and match.candidates:
+                return {
+                    "error": f"Equipo '{team_name}' es ambiguo. Indica cuál de estos equipos quieres decir.",
+                    "candidates": [{"id": t.id, "name": t.full_name} for t in match.candidates],
+                }
+            if match.team is None:
+                available_teams = ", ".join(sorted(t.full_name for t in TEAMS))
                 return {
                     "error": f"Equipo '{team_name}' no encontrado. Equipos disponibles: {available_teams}"
                 }
+            team_id, team_full_name = match.team.id, match.team.full_name
 
             today = datetime.now()
             end_date = today + timedelta(days=14)
             start_date_str = today.strftime("%Y-%m-%d")
             end_date_str = end_date.strftime("%Y-%m-%d")
 
-            response = requests.get(base_url + f"/games?team_ids[]={team_id}&start_date={start_date_str}&end_date={end_date_str}&per_page=50", headers=headers)
-            games = json.loads(response.text).get("data", [])
-
-            # Simplificación: Tomar el primer partido futuro disponible de la lista ordenada por la API
-            next_game = None
-            if games:
-                 # Asumiendo que la API devuelve los partidos ordenados cronológicamente
-                 next_game = games[0]
+            next_game = await asyncio.to_thread(store.next_game, team_id, start_date_str, end_date_str)
 
             if not next_game:
                 return {
@@ -150,9 +186,10 @@ def nba_predict_prob(home_team_id=None, away_team_id=None, team_name=None, last_
                     "message": "No hay partidos próximos programados en los próximos 14 días."
                 }
 
-            # Si solo se quiere la información del próximo juego sin predicción
-            if not get_prediction:
-                return {
+            # Si solo se quiere la información del próximo juego sin predicción,
+            # o el rival no es de la liga y el modelo no tiene valor para él
+            if not get_prediction or not _predictable(next_game):
+                result = {
                     "team": team_full_name,
                     "next_game_info": {
                         "date": next_game.get("date", "Fecha no disponible").split("T")[0],
@@ -162,23 +199,23 @@ def nba_predict_prob(home_team_id=None, away_team_id=None, team_name=None, last_
                         "status": next_game.get("status", "Estado no disponible")
                     }
                 }
+                if get_prediction:
+                    result["message"] = "No hay predicción disponible: el rival no es un equipo de la NBA."
+                return result
 
             home_id_next = next_game["home_team"]["id"]
             away_id_next = next_game["visitor_team"]["id"]
 
-            home_winrate = get_team_stats(home_id_next, last_n_games)
-            away_winrate = get_team_stats(away_id_next, last_n_games)
+            home_value, away_value = await asyncio.gather(
+                get_team_stats(home_id_next, last_n_games),
+                get_team_stats(away_id_next, last_n_games),
+            )
 
-            if home_winrate + away_winrate > 0:
-                prob = (home_winrate * 0.9 + 0.05) / (home_winrate + away_winrate)
-            else:
-                prob = 0.55
-
-            prob = min(max(prob, 0.05), 0.95)
+            prob = predictor.home_win_probability(home_value, away_value)
             winner_id = home_id_next if prob > 0.5 else away_id_next
             winner_prob = round(prob, 2) if prob > 0.5 else round(1 - prob, 2)
 
-            return {
+            return await _with_warnings({
                 "team": team_full_name,
                 "next_game": {
                     "date": next_game.get("date", "Fecha no disponible").split("T")[0],
@@ -192,50 +229,121 @@ def nba_predict_prob(home_team_id=None, away_team_id=None, team_name=None, last_
                     "away_team": ID_TO_TEAM.get(away_id_next, f"ID {away_id_next}"),
                     "probable_winner": ID_TO_TEAM.get(winner_id, f"ID {winner_id}"),
                     "probability": winner_prob,
-                    "home_winrate": round(home_winrate, 2),
-                    "away_winrate": round(away_winrate, 2),
-                    "games_analyzed": last_n_games,
-                    "note": "La probabilidad se basa en las tasas de victorias recientes y una heurística simple de ventaja de cancha."
+                    f"home_{predictor.value_key}": round(home_value, 2),
+                    f"away_{predictor.value_key}": round(away_value, 2),
+                    **_model_details(predictor, last_n_games),
                 }
-            }
+            }, store, (home_id_next, away_id_next))
 
         if home_team_id and away_team_id:
             if not (1 <= home_team_id <= 30 and 1 <= away_team_id <= 30):
                 return {"error": "Los IDs de equipo deben estar entre 1 y 30"}
 
-            home_winrate = get_team_stats(home_team_id, last_n_games)
-            away_winrate = get_team_stats(away_team_id, last_n_games)
+            home_value, away_value = await asyncio.gather(
+                get_team_stats(home_team_id, last_n_games),
+                get_team_stats(away_team_id, last_n_games),
+            )
 
-            if home_winrate + away_winrate > 0:
-                prob = (home_winrate * 0.9 + 0.05) / (home_winrate + away_winrate)
-            else:
-                prob = 0.55
-
-            prob = min(max(prob, 0.05), 0.95)
+            prob = predictor.home_win_probability(home_value, away_value)
             winner_id = home_team_id if prob > 0.5 else away_team_id
             winner_prob = round(prob, 2) if prob > 0.5 else round(1 - prob, 2)
 
-            return {
+            return await _with_warnings({
                 "home_team": ID_TO_TEAM.get(home_team_id, f"ID {home_team_id}"),
                 "away_team": ID_TO_TEAM.get(away_team_id, f"ID {away_team_id}"),
                 "probable_winner": ID_TO_TEAM.get(winner_id, f"ID {winner_id}"),
                 "probability": winner_prob,
-                "home_winrate": round(home_winrate, 2),
-                "away_winrate": round(away_winrate, 2),
-                "games_analyzed": last_n_games,
-                "note": "La probabilidad se basa en las tasas de victorias recientes y una heurística simple de ventaja de cancha."
-            }
+                f"home_{predictor.value_key}": round(home_value, 2),
+                f"away_{predictor.value_key}": round(away_value, 2),
+                **_model_details(predictor, last_n_games),
+            }, store, (home_team_id, away_team_id))
 
         return {"error": "Se requiere team_name para buscar próximo partido y su predicción, o ambos home_team_id y away_team_id para una predicción directa."}
 
+    except nba_store.SyncPending as e:
+        return {"error": str(e)}
     except Exception as e:
+        logger.exception("nba_predict_prob failed")
+        metrics.record_exception(e)
         return {"error": f"Error: {str(e)}"}
 
+
+async def nba_predict_batch(matchups: list[dict] = None, last_n_games: int = 10, model: str = None):
+    """Predice varios partidos de la NBA en una sola llamada.
+
+    Calcula los valores del modelo para los 30 equipos y la matriz de probabilidades
+    local/visitante una sola vez, y responde todas las predicciones a partir de ella.
+    Úsala cuando el usuario pida las "predicciones de hoy" o varios enfrentamientos a la vez.
+
+    Args:
+        matchups (list[dict], optional): Enfrentamientos a predecir. Cada elemento tiene
+            "home_team_id" y "away_team_id" (int, 1-30). Si se omite, predice todos los
+            partidos de hoy que aún no han terminado.
+        last_n_games (int, optional): Número de partidos anteriores a considerar para las
+            estadísticas del modelo "winrate". Por defecto es 10.
+        model (str, optional): Modelo de predicción, "winrate" o "elo". Por defecto el
+            configurado en el servidor.
+
+    Returns:
+        dict: Un diccionario con la lista "predictions" o un mensaje de error.
+    """
+    try:
+        store = nba_store.get_store()
+        await asyncio.to_thread(store.ensure_fresh)
+        predictor = nba_models.get_model(model)
+
+        result = {}
+        if not matchups:
+            today = datetime.now().strftime("%Y-%m-%d")
+            games = await asyncio.to_thread(store.games_on, today)
+            # Los partidos con equipos fuera de la liga no tienen valor en el modelo y se omiten.
+            pairs = [(g["home_team"]["id"], g["visitor_team"]["id"]) for g in games if _predictable(g)]
+            result["date"] = today
+            if not pairs:
+                return {**result, "predictions": [], "message": "No hay partidos pendientes para hoy."}
+        else:
+            pairs = []
+            for m in matchups:
+                try:
+                    pairs.append((int(m["home_team_id"]), int(m["away_team_id"])))
+                except (KeyError, TypeError, ValueError):
+                    return {"error": "Cada enfrentamiento requiere home_team_id y away_team_id numéricos."}
+            if not all(_known_team(h) and _known_team(a) for h, a in pairs):
+                return {"error": "Los IDs de equipo deben estar entre 1 y 30"}
+
+        values = await asyncio.to_thread(predictor.team_values, last_n_games)
+        matrix = _probability_matrix(predictor, values)
+        result["predictions"] = [_matchup_prediction(h, a, predictor, values, matrix) for h, a in pairs]
+        result.update(_model_details(predictor, last_n_games))
+        return await _with_warnings(result, store, [team_id for pair in pairs for team_id in pair])
+
+    except nba_store.SyncPending as e:
+        return {"error": str(e)}
+    except Exception as e:
+        logger.exception("nba_predict_batch failed")
+        metrics.record_exception(e)
+        return {"error": f"Error: {str(e)}"}
+
+
+def nba_predict_prob_sync(home_team_id=None, away_team_id=None, team_name=None, last_n_games=10, get_prediction=True, model=None):
+    """Versión síncrona de `nba_predict_prob`, conservada por compatibilidad.
+
+    Acepta los mismos argumentos y devuelve el mismo diccionario.
+    """
+    coro = nba_predict_prob(home_team_id, away_team_id, team_name, last_n_games, get_prediction, model)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Llamada desde dentro de un event loop: se ejecuta en un hilo propio para no anidar loops.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
 if __name__ == "__main__":
     try:
         with open('input.json', 'r') as f:
             data = json.load(f)
-            result = get_nba_win_probability(**data)
+            result = nba_predict_prob_sync(**data)
             print(json.dumps(result, indent=2))
     except FileNotFoundError:
         print(json.dumps({"error": "input.json no encontrado."}, indent=2))
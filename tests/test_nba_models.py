@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import pytest
+
+from my_whatsapp_agent.tools.nba_models import EloModel
+from my_whatsapp_agent.tools.nba_store import GameStore
+
+
+def _game(game_id, day, home, away, home_score, away_score):
+    return {
+        "id": game_id,
+        "date": day.isoformat(),
+        "season": 2025,
+        "status": "Final",
+        "home_team": {"id": home},
+        "visitor_team": {"id": away},
+        "home_team_score": home_score,
+        "visitor_team_score": away_score,
+    }
+
+
+def _games():
+    """10 victorias antiguas del equipo 1 y 10 recientes del equipo 2, alternando la cancha."""
+    start = date(2025, 11, 1)
+    old = [
+        _game(i, start + timedelta(days=i), 1 if i % 2 else 2, 2 if i % 2 else 1,
+              110 if i % 2 else 100, 100 if i % 2 else 110)
+        for i in range(1, 11)
+    ]
+    recent = [
+        _game(i, start + timedelta(days=i), 2 if i % 2 else 1, 1 if i % 2 else 2,
+              110 if i % 2 else 100, 100 if i % 2 else 110)
+        for i in range(11, 21)
+    ]
+    return old, recent
+
+
+def test_elo_replays_history_that_arrives_after_recent_games():
+    old, recent = _games()
+
+    chronological = GameStore(":memory:")
+    chronological.upsert_games(old + recent)
+    expected = EloModel(chronological)
+    expected.update()
+
+    # Primera sincronización: sólo la ventana reciente; el historial llega después.
+    store = GameStore(":memory:")
+    store.upsert_games(recent)
+    model = EloModel(store)
+    model.update()
+    store.upsert_games(old)
+    model.update()
+
+    assert model._ratings[1] < model._ratings[2]
+    assert model._ratings == pytest.approx(expected._ratings)
+    assert store.load_ratings("elo") == pytest.approx(chronological.load_ratings("elo"))
+    # Un modelo nuevo sobre el mismo almacén no vuelve a procesar nada.
+    assert EloModel(store).update() == 0